@@ -1,29 +1,45 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 import os
 
 
+def creer_superusers(using="default", stdout=None, **kwargs):
+    """
+    Crée les superusers de DJANGO_SUPERUSERS (« user:motdepasse:email »,
+    séparés par des virgules) s'ils n'existent pas encore. Idempotent.
+
+    Branché sur post_migrate : tourne une fois par « migrate », quand la
+    table des utilisateurs existe, et plus à chaque démarrage de processus
+    (workers gunicorn, commandes manage.py…).
+    """
+    from django.contrib.auth import get_user_model
+
+    superusers = os.environ.get("DJANGO_SUPERUSERS")
+    if not superusers:
+        return
+
+    User = get_user_model()
+    ecrire = stdout.write if stdout is not None else print
+
+    for entry in superusers.split(","):
+        try:
+            username, password, email = entry.split(":")
+        except ValueError:
+            ecrire(f"[AUTO] Superuser ignoré (format user:motdepasse:email) : {entry!r}")
+            continue
+        if not User.objects.using(using).filter(username=username).exists():
+            User.objects.db_manager(using).create_superuser(
+                username=username,
+                email=email,
+                password=password
+            )
+            ecrire(f"[AUTO] Superuser {username} created")
+
+
 class AccountsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "accounts"
 
     def ready(self):
-        from django.contrib.auth import get_user_model
-
-        superusers = os.environ.get("DJANGO_SUPERUSERS")
-        if not superusers:
-            return
-
-        User = get_user_model()
-
-        for entry in superusers.split(","):
-            try:
-                username, password, email = entry.split(":")
-                if not User.objects.filter(username=username).exists():
-                    User.objects.create_superuser(
-                        username=username,
-                        email=email,
-                        password=password
-                    )
-                    print(f"[AUTO] Superuser {username} created")
-            except Exception as e:
-                print("[AUTO] Superuser error:", e)
+        # pas d'accès base ici : ready() tourne dans chaque processus
+        post_migrate.connect(creer_superusers, sender=self)
@@ -0,0 +1,33 @@
+# accounts/backends.py
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+UserModel = get_user_model()
+
+
+class ModelBackendAvecCentre(ModelBackend):
+    """
+    ModelBackend qui charge le centre avec l'utilisateur (select_related).
+
+    request.user est chargé par AuthenticationMiddleware via get_user() : le
+    centre vient dans la même requête SQL, et ni base.html (« Centre : … »)
+    ni les vues ne relisent ensuite la table des centres.
+    """
+
+    def _utilisateurs(self):
+        return UserModel._default_manager.select_related("centre")
+
+    def get_user(self, user_id):
+        try:
+            user = self._utilisateurs().get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        # request.auser() des vues async (gestion/views_async.py)
+        try:
+            user = await self._utilisateurs().aget(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -1,5 +1,21 @@
-from django.contrib import admin
-from .models import Centre, Livre, ReleveCentreLivre
+from django import forms
+from django.contrib import admin, messages
+from django.shortcuts import redirect, render
+from django.urls import path
+
+from .importation import ErreurImport, importer_releves
+from .models import Centre, CumulMensuel, Livre, ReleveCentreLivre, TacheExportPdf
+from .recalcul import recalculer_releves
+
+
+class ImportRelevesForm(forms.Form):
+    fichier = forms.FileField(
+        label="Fichier CSV ou XLSX",
+        help_text=(
+            "Colonnes : centre, livre (code), date_debut, date_fin, quantite_recue, "
+            "quantite_vendue ; en option prix_unitaire, depenses, operateur, taux_frais_retrait."
+        ),
+    )
 
 
 @admin.register(Centre)
@@ -26,3 +42,85 @@ class ReleveCentreLivreAdmin(admin.ModelAdmin):
     )
     list_filter = ("centre", "livre", "date_debut", "date_fin")
     search_fields = ("centre__nom", "livre__nom")
+    change_list_template = "admin/gestion/relevecentrelivre/change_list.html"
+    actions = ["recalculer"]
+
+    @admin.action(
+        description="Recalculer montants, reste et frais Mobile Money",
+        permissions=["change"],
+    )
+    def recalculer(self, request, queryset):
+        resultat = recalculer_releves(queryset)
+        self.message_user(request, str(resultat), messages.SUCCESS)
+
+    def get_urls(self):
+        urls = [
+            path(
+                "importer/",
+                self.admin_site.admin_view(self.importer_view),
+                name="gestion_relevecentrelivre_importer",
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def importer_view(self, request):
+        """Upload d'un fichier CSV / XLSX de relevés (voir gestion/importation.py)."""
+        if not self.has_add_permission(request):
+            return redirect("admin:gestion_relevecentrelivre_changelist")
+
+        form = ImportRelevesForm(request.POST or None, request.FILES or None)
+        if request.method == "POST" and form.is_valid():
+            fichier = form.cleaned_data["fichier"]
+            try:
+                resultat = importer_releves(fichier, fichier.name)
+            except ErreurImport as e:
+                form.add_error("fichier", str(e))
+            else:
+                self.message_user(request, str(resultat), messages.SUCCESS)
+                for numero, message in resultat.erreurs[:20]:
+                    self.message_user(request, f"Ligne {numero} : {message}", messages.WARNING)
+                if len(resultat.erreurs) > 20:
+                    self.message_user(
+                        request,
+                        f"… et {len(resultat.erreurs) - 20} autre(s) ligne(s) rejetée(s).",
+                        messages.WARNING,
+                    )
+                return redirect("admin:gestion_relevecentrelivre_changelist")
+
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Importer des relevés",
+            "form": form,
+        }
+        return render(request, "admin/gestion/relevecentrelivre/importer.html", context)
+
+
+@admin.register(CumulMensuel)
+class CumulMensuelAdmin(admin.ModelAdmin):
+    list_display = (
+        "centre",
+        "livre",
+        "annee",
+        "mois",
+        "nb_releves",
+        "quantite_vendue",
+        "montant_ventes",
+    )
+    list_filter = ("annee", "mois", "centre", "livre")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TacheExportPdf)
+class TacheExportPdfAdmin(admin.ModelAdmin):
+    list_display = ("nom_fichier", "statut", "demandee_par", "cree_le", "terminee_le")
+    list_filter = ("statut",)
+    readonly_fields = ("cle", "spec", "demarree_le", "terminee_le", "erreur")
+
+    def has_add_permission(self, request):
+        return False
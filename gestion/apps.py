@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.core.signals import request_finished
+from django.db.backends.signals import connection_created
 
 
 class GestionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gestion'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from . import sqlite
+
+        # ne font rien tant que SQLITE_PERFORMANCES est à False
+        connection_created.connect(sqlite.appliquer_pragmas, dispatch_uid="gestion_sqlite_pragmas")
+        request_finished.connect(sqlite.optimiser, dispatch_uid="gestion_sqlite_optimize")
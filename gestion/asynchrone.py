@@ -0,0 +1,46 @@
+# gestion/asynchrone.py
+"""
+Requêtes ORM depuis les vues async (gestion/views_async.py).
+
+L'ORM async de Django (acount, aaggregate…) passe par sync_to_async en mode
+thread_sensitive : toutes les requêtes d'une vue s'exécutent l'une après
+l'autre dans le même thread. en_parallele() lance au contraire des fonctions
+ORM indépendantes chacune dans un thread du pool (donc sur sa propre
+connexion) et les attend ensemble.
+"""
+import asyncio
+from contextlib import ExitStack
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connections
+
+from . import instrumentation
+
+
+def _dans_un_thread(fonction):
+    def executer():
+        # même cycle de vie que pour une requête : la connexion de ce thread
+        # est gardée jusqu'à CONN_MAX_AGE, fermée si obsolète ou cassée
+        close_old_connections()
+        try:
+            with ExitStack() as pile:
+                # requêtes comptées dans Server-Timing comme celles de la vue
+                for connexion in connections.all():
+                    pile.enter_context(
+                        connexion.execute_wrapper(instrumentation.chronometrer_sql)
+                    )
+                return fonction()
+        finally:
+            close_old_connections()
+
+    return sync_to_async(executer, thread_sensitive=False)
+
+
+async def en_thread(fonction):
+    """Exécute fonction() (code ORM synchrone) dans un thread du pool."""
+    return await _dans_un_thread(fonction)()
+
+
+async def en_parallele(*fonctions):
+    """Résultats de plusieurs fonctions ORM indépendantes, exécutées en même temps."""
+    return await asyncio.gather(*(en_thread(f) for f in fonctions))
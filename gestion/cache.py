@@ -0,0 +1,208 @@
+# gestion/cache.py
+"""
+Cache des rapports, par (type de rapport, période, périmètre utilisateur).
+
+Chaque clé embarque trois jetons de version :
+  - un jeton global (changé quand un livre est créé / modifié / supprimé),
+  - un jeton de périmètre ("admin" ou "centre-<id>", changé quand un centre change),
+  - un jeton de période pour ce périmètre (changé quand un relevé de la période
+    est créé, modifié ou supprimé).
+Changer un jeton rend orphelines les entrées concernées, sans toucher aux autres.
+"""
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+PREFIXE = "rapports"
+
+
+def periode_semaine(year, week):
+    return f"semaine-{year}-S{week:02d}"
+
+
+def periode_mois(year, month):
+    return f"mois-{year}-{month:02d}"
+
+
+def periode_trimestre(year, quarter):
+    return f"trimestre-{year}-T{quarter}"
+
+
+def periode_annee(year):
+    return f"annee-{year}"
+
+
+PERIODE_GLOBALE = "global"
+
+
+def periodes_de_la_date(d):
+    """Toutes les périodes de rapport qui contiennent un relevé finissant le jour d."""
+    iso = d.isocalendar()
+    return [
+        periode_semaine(iso.year, iso.week),
+        periode_mois(d.year, d.month),
+        periode_trimestre(d.year, (d.month - 1) // 3 + 1),
+        periode_annee(d.year),
+        PERIODE_GLOBALE,
+    ]
+
+
+def _cle_jeton(*parties):
+    return ":".join((PREFIXE, "jeton") + parties)
+
+
+def _jetons(cles):
+    """Lit les jetons ; un jeton absent (jamais créé ou évincé) est recréé."""
+    jetons = cache.get_many(cles)
+    for cle in cles:
+        if cle not in jetons:
+            cache.add(cle, uuid.uuid4().hex[:12], None)
+            jetons[cle] = cache.get(cle)
+    return [jetons[cle] for cle in cles]
+
+
+def _renouveler(cles):
+    cache.set_many({cle: uuid.uuid4().hex[:12] for cle in cles}, None)
+
+
+def cle_rapport(type_rapport, periode, scope):
+    jetons = _jetons([
+        _cle_jeton("global"),
+        _cle_jeton(scope),
+        _cle_jeton(scope, periode),
+    ])
+    return ":".join([PREFIXE, type_rapport, periode, scope] + jetons)
+
+
+def cache_actif():
+    """
+    Vrai si les résultats de rapports peuvent être mis en cache : il faut
+    que les jetons soient partagés par tous les processus, sinon une
+    écriture n'invaliderait que le cache du worker qui l'a faite. Un cache
+    local au processus (LocMemCache) ne sert que si RAPPORTS_CACHE_LOCAL
+    dit qu'il n'y a qu'un processus (runserver).
+    """
+    return settings.RAPPORTS_CACHE_LOCAL or not isinstance(caches["default"], LocMemCache)
+
+
+def resultat_en_cache(type_rapport, periode, scope, calcul):
+    """
+    Retourne le résultat de calcul() pour ce rapport, depuis le cache si
+    possible. calcul ne doit dépendre que de la période et du périmètre
+    ("admin" ou "centre-<id>").
+    """
+    if not cache_actif():
+        return calcul()
+    cle = cle_rapport(type_rapport, periode, scope)
+    resultat = cache.get(cle)
+    if resultat is None:
+        resultat = calcul()
+        cache.set(cle, resultat, settings.RAPPORTS_CACHE_TIMEOUT)
+    return resultat
+
+
+async def aresultat_en_cache(type_rapport, periode, scope, acalcul):
+    """resultat_en_cache pour les vues async : acalcul est une fonction async."""
+    if not cache_actif():
+        return await acalcul()
+    cle = await sync_to_async(cle_rapport)(type_rapport, periode, scope)
+    resultat = await cache.aget(cle)
+    if resultat is None:
+        resultat = await acalcul()
+        await cache.aset(cle, resultat, settings.RAPPORTS_CACHE_TIMEOUT)
+    return resultat
+
+
+# un recalcul en cours bloque les autres pendant au plus ce délai (secondes)
+DUREE_VERROU = 30
+# une valeur périmée peut encore être servie pendant ce délai (secondes)
+DUREE_PERIME_MAX = 600
+# sans valeur à servir, attente au plus ce délai (secondes) du calcul en cours
+DUREE_ATTENTE = 5
+
+
+def _attendre_calcul(cle, verrou):
+    """Entrée écrite par le détenteur du verrou, ou None s'il l'a lâché sans rien écrire ou tarde trop."""
+    limite = time.monotonic() + DUREE_ATTENTE
+    while time.monotonic() < limite:
+        time.sleep(0.05)
+        entree = cache.get(cle)
+        if entree is not None:
+            return entree
+        if cache.get(verrou) is None:
+            return None
+    return None
+
+
+def resultat_perime_accepte(type_rapport, periode, scope, calcul, duree_fraiche):
+    """
+    Comme resultat_en_cache, en « stale-while-revalidate » : une valeur plus
+    vieille que duree_fraiche, ou calculée avant une écriture (jetons
+    changés), est recalculée par une seule requête (verrou cache.add) ;
+    pendant ce temps les autres requêtes reçoivent l'ancienne valeur au lieu
+    de relancer toutes le même calcul. Sans valeur en cache (premier calcul,
+    entrée évincée), elles attendent le résultat de celle qui calcule.
+
+    Protection au mieux : cache.add n'est atomique que sur les caches qui le
+    garantissent (memcached, Redis, base, LocMem). Sur FileBasedCache (celui
+    de settings.py) il lit puis écrit le fichier, deux processus peuvent donc
+    prendre le verrou ensemble et faire le même calcul : du travail en
+    double, jamais un résultat faux.
+    """
+    if not cache_actif():
+        return calcul()
+    cle = ":".join([PREFIXE, type_rapport, periode, scope])
+    version = cle_rapport(type_rapport, periode, scope)
+    entree = cache.get(cle)
+    maintenant = time.time()
+    verrou = cle + ":verrou"
+    if entree is not None:
+        version_entree, fraiche_jusqua, valeur = entree
+        if version_entree == version and maintenant < fraiche_jusqua:
+            return valeur
+    verrou_pris = cache.add(verrou, 1, DUREE_VERROU)
+    if not verrou_pris:
+        # un autre processus recalcule déjà
+        if entree is None:
+            entree = _attendre_calcul(cle, verrou)
+        if entree is not None:
+            return entree[2]
+    try:
+        valeur = calcul()
+        cache.set(
+            cle,
+            (version, maintenant + duree_fraiche, valeur),
+            duree_fraiche + DUREE_PERIME_MAX,
+        )
+    finally:
+        if verrou_pris:
+            cache.delete(verrou)
+    return valeur
+
+
+def invalider_releve(centre_id, date_fin):
+    """Invalide les périodes touchées par un relevé, pour l'admin et son centre."""
+    invalider_releves([(centre_id, date_fin)])
+
+
+def invalider_releves(touches):
+    """Comme invalider_releve, pour plusieurs (centre_id, date_fin) en un seul set_many."""
+    cles = set()
+    for centre_id, date_fin in touches:
+        for periode in periodes_de_la_date(date_fin):
+            cles.add(_cle_jeton("admin", periode))
+            cles.add(_cle_jeton(f"centre-{centre_id}", periode))
+    if cles:
+        _renouveler(sorted(cles))
+
+
+def invalider_centre(centre_id):
+    _renouveler([_cle_jeton("admin"), _cle_jeton(f"centre-{centre_id}")])
+
+
+def invalider_livres():
+    _renouveler([_cle_jeton("global")])
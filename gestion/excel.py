@@ -0,0 +1,180 @@
+# gestion/excel.py
+"""
+Classeurs Excel au format VIAT/ACT.
+
+Module à part pour qu'openpyxl ne soit importé qu'au premier export :
+gestion/views.py ne l'importe que dans la vue d'export, les autres pages
+(et le démarrage des workers) ne paient pas son chargement.
+"""
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
+from openpyxl.styles import Alignment, Font, NamedStyle, PatternFill
+
+from .instrumentation import mesurer
+
+# Styles nommés du fichier VIAT/ACT : déclarés une fois par classeur,
+# chaque cellule y fait référence par son nom.
+EXCEL_STYLES = {
+    # nom : (gras, couleur police, remplissage, alignement horizontal)
+    "viat_titre": (True, None, "C4D79B", "center"),    # vert
+    "viat_valeur": (False, None, "C4D79B", "right"),
+    "act_titre": (True, None, "FFF2CC", "center"),     # jaune
+    "act_valeur": (False, None, "FFF2CC", "right"),
+    "entete": (True, None, None, "center"),
+    "entete_bleu": (True, None, "9BC2E6", "center"),
+    "entete_vert": (True, None, "C6E0B4", "center"),
+    "entete_jaune": (True, None, "FFFF00", "center"),
+    "nombre": (False, None, None, "right"),
+    "total_titre": (True, "FFFFFF", "FF0000", "center"),
+    "total_valeur": (True, "FFFFFF", "FF0000", "right"),
+}
+
+
+def _ajouter_styles_excel(wb):
+    for nom, (gras, couleur, fond, horizontal) in EXCEL_STYLES.items():
+        style = NamedStyle(name=nom)
+        style.font = Font(bold=gras, color=couleur)
+        style.alignment = Alignment(horizontal=horizontal, vertical="center")
+        if fond:
+            style.fill = PatternFill(start_color=fond, end_color=fond, fill_type="solid")
+        wb.add_named_style(style)
+
+
+def _ecrire_feuille_via_act(ws, resultat):
+    """
+    Écrit une feuille VIAT/ACT ligne par ligne (classeur en écriture seule :
+    les lignes partent dans le fichier au fur et à mesure).
+    """
+    def cell(value, style=None):
+        c = WriteOnlyCell(ws, value=value)
+        if style:
+            c.style = style
+        return c
+
+    # On cible spécifiquement les livres "Viatique" et "Activités"
+    viatique = resultat.viatique
+    activite = resultat.activite
+
+    # Totaux globaux pour les 2 lignes du haut
+    g_viat = resultat.totaux(viatique)
+    g_act = resultat.totaux(activite)
+
+    # Largeurs colonnes (à fixer avant d'écrire les lignes)
+    widths = {
+        1: 18, 2: 8, 3: 8, 4: 10, 5: 8, 6: 12,
+        7: 10, 8: 8, 9: 12, 10: 10, 11: 10, 12: 12,
+    }
+    for col_idx, width in widths.items():
+        ws.column_dimensions[get_column_letter(col_idx)].width = width
+
+    # Lignes 2–3 : résumé global par livre
+    ws.append([])
+    ws.append([
+        None,
+        cell("VIATIQUE", "viat_titre"),
+        cell(g_viat["q_recue"], "viat_valeur"),
+        cell(g_viat["q_vendue"], "viat_valeur"),
+        cell(g_viat["reste"], "viat_valeur"),
+    ])
+    ws.append([
+        None,
+        cell("ACTIVITE", "act_titre"),
+        cell(g_act["q_recue"], "act_valeur"),
+        cell(g_act["q_vendue"], "act_valeur"),
+        cell(g_act["reste"], "act_valeur"),
+    ])
+    ws.append([])
+
+    # Ligne d’en-tête principale (ligne 5)
+    header_row = 5
+    headers = [
+        "CENTRE",     # A
+        "VIAT",       # B (quantité reçue viat)
+        "ACT",        # C (quantité reçue act)
+        "VEN VIAT",   # D
+        "PU",         # E (prix unitaire viat)
+        "MTANT",      # F (montant viat)
+        "VENT ACT",   # G
+        "PU",         # H (prix unitaire act)
+        "MTANT",      # I (montant act)
+        "RES VIA",    # J
+        "RES ACT",    # K
+        "DEPENSES",   # L
+    ]
+    entetes = []
+    for label in headers:
+        if label in ("VIAT", "VEN VIAT", "PU", "MTANT", "RES VIA"):
+            style = "entete_bleu"
+        elif label in ("ACT", "VENT ACT", "RES ACT"):
+            style = "entete_vert"
+        elif label == "DEPENSES":
+            style = "entete_jaune"
+        else:
+            style = "entete"
+        entetes.append(cell(label, style))
+    ws.append(entetes)
+
+    # Lignes de données (centres)
+    first_data_row = header_row + 1
+
+    # On utilisera les prix unitaires par défaut des livres
+    pu_viat = float(viatique.prix_unitaire_defaut) if viatique else 0
+    pu_act = float(activite.prix_unitaire_defaut) if activite else 0
+
+    for row in resultat.rows:
+        centre = row["centre"]
+        s_viat = resultat.cellule(row, viatique)
+        s_act = resultat.cellule(row, activite)
+
+        valeurs = [
+            s_viat["q_recue"],                     # VIAT
+            s_act["q_recue"],                      # ACT
+            s_viat["q_vendue"],                    # VEN VIAT
+            pu_viat,                               # PU (viat)
+            float(s_viat["montant"]),              # MTANT (viat)
+            s_act["q_vendue"],                     # VENT ACT
+            pu_act,                                # PU (act)
+            float(s_act["montant"]),               # MTANT (act)
+            s_viat["reste"],                       # RES VIA
+            s_act["reste"],                        # RES ACT
+            float(s_viat["dep"] + s_act["dep"]),   # DEPENSES
+        ]
+        ws.append([centre.nom] + [cell(v, "nombre") for v in valeurs])
+
+    last_data_row = first_data_row + len(resultat.rows) - 1
+
+    # Ligne TOTAL
+    ligne_total = [cell("TOTAL", "total_titre")]
+    for col in range(2, 13):
+        letter = get_column_letter(col)
+        ligne_total.append(cell(
+            f"=SUM({letter}{first_data_row}:{letter}{last_data_row})",
+            "total_valeur",
+        ))
+    ws.append(ligne_total)
+    ws.append([])
+
+    # Ligne SOMME
+    ws.append([
+        None, None, None, None,
+        cell("SOMME", "total_titre"),
+        cell(
+            f"=SUM(F{first_data_row}:F{last_data_row})+SUM(I{first_data_row}:I{last_data_row})",
+            "total_valeur",
+        ),
+    ])
+
+
+def ecrire_classeur_via_act(feuilles, fichier):
+    """
+    Écrit le classeur dans fichier. Le classeur est en écriture seule : la
+    mémoire reste bornée quel que soit le nombre de centres.
+    """
+    with mesurer("excel"):
+        wb = openpyxl.Workbook(write_only=True)
+        _ajouter_styles_excel(wb)
+        for sheet_title, resultat in feuilles:
+            ws = wb.create_sheet(title=sheet_title)
+            _ecrire_feuille_via_act(ws, resultat)
+        wb.save(fichier)
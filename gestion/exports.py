@@ -0,0 +1,215 @@
+# gestion/exports.py
+"""
+Rendu des exports PDF et cache disque des fichiers d'export.
+
+Un fichier d'export est rangé sous l'empreinte (sha256) de tout ce qui le
+détermine : format, spec du rapport, titres et contenu des feuilles. Deux
+demandes qui donneraient le même fichier le lisent donc sur disque au lieu
+de relancer xhtml2pdf / openpyxl, et l'empreinte sert d'ETag fort.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou entre processus
+    fcntl = None
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.template.loader import render_to_string
+
+from .instrumentation import mesurer
+from .rapports import ANNEE, CHAMPS_AGREGES, MOIS, TRIMESTRE, contexte_rapport
+
+# à augmenter quand la mise en page d'un export change (gabarit, styles…) :
+# les fichiers déjà en cache ne sont alors plus servis
+VERSION_EXPORTS = 1
+
+_rendus = 0
+_verrou_rendus = threading.Lock()
+
+GABARITS_PDF = {
+    MOIS: "gestion/pdf_rapport_mensuel.html",
+    TRIMESTRE: "gestion/pdf_rapport_trimestriel.html",
+    ANNEE: "gestion/pdf_rapport_annuel.html",
+}
+
+
+def nom_fichier_pdf(spec):
+    if spec.type_periode == MOIS:
+        return f"rapport_mensuel_{spec.annee}_{spec.numero:02d}.pdf"
+    if spec.type_periode == TRIMESTRE:
+        return f"rapport_trimestriel_{spec.annee}_T{spec.numero}.pdf"
+    return f"rapport_annuel_{spec.annee}.pdf"
+
+
+def _donnees(resultat):
+    """Contenu d'un RapportResultat sous forme sérialisable (pour l'empreinte)."""
+    return [
+        [(livre.pk, livre.code, livre.nom) for livre in resultat.livres],
+        [
+            [
+                row["centre"].pk,
+                row["centre"].nom,
+                [[data[cle] for cle in CHAMPS_AGREGES] for data in row["livres"]],
+            ]
+            for row in resultat.rows
+        ],
+    ]
+
+
+def empreinte_export(format_export, spec, feuilles):
+    """sha256 d'un export : format, spec et [(titre, RapportResultat)] des feuilles."""
+    h = hashlib.sha256()
+    h.update(json.dumps([VERSION_EXPORTS, format_export, spec.to_dict()]).encode())
+    for titre, resultat in feuilles:
+        h.update(json.dumps([titre, _donnees(resultat)], cls=DjangoJSONEncoder).encode())
+    return h.hexdigest()
+
+
+def _dossier():
+    dossier = Path(settings.EXPORTS_CACHE_DIR)
+    dossier.mkdir(parents=True, exist_ok=True)
+    return dossier
+
+
+def chemin_en_cache(empreinte, extension):
+    """Chemin du fichier déjà généré pour cette empreinte, ou None."""
+    chemin = _dossier() / f"{empreinte}{extension}"
+    try:
+        # date de modification = dernier accès : la purge garde les fichiers servis
+        os.utime(chemin)
+    except FileNotFoundError:
+        return None
+    return chemin
+
+
+@contextmanager
+def _verrou(chemin):
+    """Verrou exclusif entre threads et processus (flock sur un fichier)."""
+    if fcntl is None:
+        yield
+        return
+    with open(chemin, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def obtenir(empreinte, extension, ecrire):
+    """
+    Chemin du fichier de cette empreinte ; s'il n'existe pas, ecrire(fichier)
+    le génère dans un fichier temporaire renommé ensuite (jamais de fichier
+    à moitié écrit visible, même avec plusieurs workers). Un seul rendu par
+    empreinte à la fois : les demandes simultanées attendent le premier.
+    """
+    chemin = chemin_en_cache(empreinte, extension)
+    if chemin is not None:
+        return chemin
+    if _purge_due():
+        # avant le rendu : le fichier qu'on va rendre ne peut pas être purgé
+        purger_cache(settings.EXPORTS_CACHE_CONSERVER_HEURES * 3600)
+    dossier = _dossier()
+    with _verrou(dossier / f"{empreinte}{extension}.verrou"):
+        # rendu peut-être terminé par un autre thread / worker pendant l'attente
+        chemin = chemin_en_cache(empreinte, extension)
+        if chemin is not None:
+            return chemin
+        descripteur, temporaire = tempfile.mkstemp(dir=dossier, suffix=".tmp")
+        try:
+            with os.fdopen(descripteur, "wb") as fichier:
+                ecrire(fichier)
+            chemin = dossier / f"{empreinte}{extension}"
+            os.replace(temporaire, chemin)
+        except BaseException:
+            os.unlink(temporaire)
+            raise
+    return chemin
+
+
+def _purge_due():
+    """Vrai tous les EXPORTS_PURGE_RENDUS exports absents du cache (par processus)."""
+    global _rendus
+    if settings.EXPORTS_PURGE_RENDUS <= 0:
+        return False
+    with _verrou_rendus:
+        _rendus += 1
+        if _rendus < settings.EXPORTS_PURGE_RENDUS:
+            return False
+        _rendus = 0
+        return True
+
+
+def _supprimer_verrou(chemin):
+    """Supprime un fichier .verrou si personne ne le tient ; False s'il est pris."""
+    if fcntl is None:
+        chemin.unlink()
+        return True
+    with open(chemin, "rb") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        # supprimé verrou tenu ; une demande qui attendait sur ce fichier peut
+        # au pire refaire un rendu déjà fait (même empreinte, même fichier)
+        chemin.unlink()
+    return True
+
+
+def purger_cache(age_max):
+    """
+    Supprime les exports non servis depuis age_max secondes (0 : tous), les
+    temporaires aussi vieux et les .verrou orphelins ; retourne le nombre
+    d'exports supprimés. Les verrous tenus par un rendu en cours restent.
+    """
+    limite = time.time() - age_max
+    supprimes = 0
+    for chemin in _dossier().iterdir():
+        try:
+            if chemin.stat().st_mtime > limite:
+                continue
+            if chemin.suffix == ".verrou":
+                _supprimer_verrou(chemin)
+                continue
+            chemin.unlink()
+            if chemin.suffix != ".tmp":
+                supprimes += 1
+        except FileNotFoundError:
+            pass
+    return supprimes
+
+
+def ecrire_pdf(spec, resultat, fichier):
+    """Rend le PDF d'un rapport (même données que la page HTML) dans fichier."""
+    # xhtml2pdf (reportlab, PIL, html5lib…) n'est chargé qu'au premier PDF
+    from xhtml2pdf import pisa
+
+    context = contexte_rapport(spec, resultat)
+    html = render_to_string(GABARITS_PDF[spec.type_periode], context)
+    with mesurer("pdf"):
+        status = pisa.CreatePDF(html, dest=fichier)
+    if status.err:
+        raise RuntimeError(f"xhtml2pdf : {status.err} erreur(s) de rendu")
+
+
+def pdf_en_cache(spec):
+    """(empreinte, chemin) du PDF de spec, rendu seulement s'il n'est pas déjà sur disque."""
+    resultat = spec.resoudre()
+    empreinte = empreinte_export("pdf", spec, [("", resultat)])
+    chemin = obtenir(empreinte, ".pdf", lambda f: ecrire_pdf(spec, resultat, f))
+    return empreinte, chemin
+
+
+def rendre_pdf(spec):
+    """Octets du PDF d'un rapport (depuis le cache disque si possible)."""
+    _, chemin = pdf_en_cache(spec)
+    return chemin.read_bytes()
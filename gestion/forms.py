@@ -1,6 +1,6 @@
 # gestion/forms.py
 from django import forms
-from .models import ReleveCentreLivre, Livre, Centre
+from .models import ReleveCentreLivre, Livre, Centre, centre_perimetre
 
 
 from django import forms
@@ -107,9 +107,9 @@ class ReleveCentreLivreForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
 
         # Si l'utilisateur est un centre, on fixe son centre et on le bloque
-        if user and hasattr(user, "is_centre") and user.is_centre() and user.centre_id:
-            self.fields["centre"].queryset = Centre.objects.filter(pk=user.centre_id)
-            self.fields["centre"].initial = user.centre
+        if centre_perimetre(user):
+            self.fields["centre"].queryset = Centre.objects.visible_to(user)
+            self.fields["centre"].initial = user.centre_id
             self.fields["centre"].disabled = True
 
 
@@ -183,3 +183,57 @@ class CentreForm(forms.ModelForm):
                 }
             ),
         }
+
+
+class ReleveFiltreForm(forms.Form):
+    """Filtres (GET) de la liste des relevés."""
+
+    centre = forms.ModelChoiceField(
+        queryset=Centre.objects.order_by("nom"),
+        required=False,
+        empty_label="Tous les centres",
+        widget=forms.Select(attrs={"class": "rounded-lg border border-slate-300 px-3 py-2 text-sm"}),
+    )
+    livre = forms.ModelChoiceField(
+        queryset=Livre.objects.order_by("nom"),
+        required=False,
+        empty_label="Tous les livres",
+        widget=forms.Select(attrs={"class": "rounded-lg border border-slate-300 px-3 py-2 text-sm"}),
+    )
+    operateur = forms.ChoiceField(
+        choices=(("", "Tous les opérateurs"),) + ReleveCentreLivre.OPERATEUR_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={"class": "rounded-lg border border-slate-300 px-3 py-2 text-sm"}),
+    )
+    du = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={"type": "date", "class": "rounded-lg border border-slate-300 px-3 py-2 text-sm"}),
+    )
+    au = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={"type": "date", "class": "rounded-lg border border-slate-300 px-3 py-2 text-sm"}),
+    )
+
+    def __init__(self, *args, **kwargs):
+        user = kwargs.pop("user", None)
+        super().__init__(*args, **kwargs)
+        # un centre ne voit que ses relevés : pas de choix de centre
+        if centre_perimetre(user):
+            del self.fields["centre"]
+
+    def filtrer(self, qs):
+        """Applique les filtres valides au queryset de relevés."""
+        if not self.is_valid():
+            return qs
+        data = self.cleaned_data
+        if data.get("centre"):
+            qs = qs.filter(centre=data["centre"])
+        if data.get("livre"):
+            qs = qs.filter(livre=data["livre"])
+        if data.get("operateur"):
+            qs = qs.filter(operateur_mobile_money=data["operateur"])
+        if data.get("du"):
+            qs = qs.filter(date_fin__gte=data["du"])
+        if data.get("au"):
+            qs = qs.filter(date_fin__lte=data["au"])
+        return qs
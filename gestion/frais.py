@@ -0,0 +1,129 @@
+# gestion/frais.py
+"""
+Barème des frais de retrait Mobile Money, sous forme de données.
+
+Chaque opérateur a une liste de barèmes datés (date d'effet) ; un barème
+est une liste de paliers triés par seuil. Un palier s'applique à partir de
+son seuil (inclus, ou exclu si « exclusif ») jusqu'au palier suivant :
+  - ("taux", t)  : frais = montant × t %, taux enregistré = t
+  - ("fixe", f)  : frais = f, taux enregistré = taux effectif f / montant
+Les barèmes sont compilés une fois en listes triées ; un lot de montants
+se calcule avec deux bisect par ligne (date d'effet, puis palier).
+
+Pour un changement de tarif : ajouter un barème daté à l'opérateur ; les
+relevés dont date_fin est postérieure à la date d'effet prennent le nouveau
+barème.
+"""
+from bisect import bisect_right
+from datetime import date
+from decimal import Decimal
+from functools import lru_cache
+
+DEUX_DECIMALES = Decimal("0.01")
+CENT = Decimal("100")
+
+# opérateur -> [(date d'effet, [(seuil, exclusif, type, valeur), ...]), ...]
+BAREMES_MOBILE_MONEY = {
+    "ORANGE": [
+        (date.min, [(Decimal("0"), True, "taux", Decimal("1.00"))]),
+    ],
+    "MOOV": [
+        (date.min, [(Decimal("0"), True, "taux", Decimal("1.00"))]),
+    ],
+    # retrait gratuit
+    "WAVE": [
+        (date.min, [(Decimal("0"), True, "taux", Decimal("0.00"))]),
+    ],
+    # < 100 000 : 0 ; 100 000 à 500 000 : 1 % ; > 500 000 : 5 000 FCFA fixe
+    "MTN": [
+        (date.min, [
+            (Decimal("0"), True, "taux", Decimal("0.00")),
+            (Decimal("100000"), False, "taux", Decimal("1.00")),
+            (Decimal("500000"), True, "fixe", Decimal("5000.00")),
+        ]),
+    ],
+}
+
+
+class Bareme:
+    """Paliers d'un opérateur à une date, prêts pour bisect."""
+
+    def __init__(self, paliers):
+        paliers = sorted(paliers, key=lambda p: (p[0], p[1]))
+        # (seuil, 0) est dépassé dès montant == seuil, (seuil, 1) seulement
+        # au-delà : on cherche (montant, 0.5) dans ces clés
+        self.cles = [(seuil, 1 if exclusif else 0) for seuil, exclusif, _, _ in paliers]
+        self.regles = [(type_regle, valeur) for _, _, type_regle, valeur in paliers]
+
+    def appliquer(self, montant):
+        """(frais, taux) pour un montant > 0 ; (Decimal("0"), None) hors barème."""
+        i = bisect_right(self.cles, (montant, 0.5)) - 1
+        if i < 0:
+            return Decimal("0"), None
+        type_regle, valeur = self.regles[i]
+        if type_regle == "taux":
+            return (montant * valeur / CENT).quantize(DEUX_DECIMALES), valeur
+        # montant fixe : on enregistre aussi le taux effectif
+        return valeur, (valeur * CENT / montant).quantize(DEUX_DECIMALES)
+
+
+class Grille:
+    """Barèmes de tous les opérateurs, indexés par date d'effet."""
+
+    def __init__(self, baremes):
+        self.operateurs = {}
+        for operateur, versions in baremes.items():
+            versions = sorted(versions, key=lambda v: v[0])
+            self.operateurs[operateur] = (
+                [date_effet for date_effet, _ in versions],
+                [Bareme(paliers) for _, paliers in versions],
+            )
+
+    def bareme(self, operateur, jour=None):
+        """Barème en vigueur le jour donné (le plus récent si jour est None)."""
+        versions = self.operateurs.get(operateur)
+        if versions is None:
+            return None
+        dates, baremes = versions
+        if jour is None:
+            return baremes[-1]
+        i = bisect_right(dates, jour) - 1
+        return baremes[i] if i >= 0 else None
+
+    def calculer(self, operateur, montant, jour=None):
+        """(frais, taux_en_pourcentage_ou_None) d'un relevé."""
+        montant = montant or Decimal("0")
+        if not operateur or montant <= 0:
+            return Decimal("0"), None
+        bareme = self.bareme(operateur, jour)
+        if bareme is None:
+            return Decimal("0"), None
+        return bareme.appliquer(montant)
+
+    def calculer_lot(self, lignes):
+        """
+        Frais d'un lot de (operateur, montant, jour) en une passe ; le barème
+        est cherché une fois par (opérateur, jour) distinct.
+        """
+        baremes = {}
+        resultats = []
+        for operateur, montant, jour in lignes:
+            montant = montant or Decimal("0")
+            if not operateur or montant <= 0:
+                resultats.append((Decimal("0"), None))
+                continue
+            cle = (operateur, jour)
+            if cle not in baremes:
+                baremes[cle] = self.bareme(operateur, jour)
+            bareme = baremes[cle]
+            if bareme is None:
+                resultats.append((Decimal("0"), None))
+            else:
+                resultats.append(bareme.appliquer(montant))
+        return resultats
+
+
+@lru_cache(maxsize=1)
+def grille():
+    """Grille compilée de BAREMES_MOBILE_MONEY (construite au premier appel)."""
+    return Grille(BAREMES_MOBILE_MONEY)
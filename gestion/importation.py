@@ -0,0 +1,279 @@
+# gestion/importation.py
+"""
+Import en masse de relevés depuis un fichier CSV ou XLSX.
+
+Colonnes attendues (ligne d'en-tête, ordre libre, casse ignorée) :
+  centre (nom), livre (code), date_debut, date_fin, quantite_recue,
+  quantite_vendue, et en option prix_unitaire, depenses, operateur,
+  taux_frais_retrait.
+
+Les centres / livres sont résolus en mémoire, les montants et frais calculés
+par lot, puis les lignes écrites par lots avec bulk_create en « upsert »
+sur (centre, livre, date_debut, date_fin). Les cumuls mensuels et le cache
+des rapports des mois touchés sont remis à jour à la fin.
+"""
+import codecs
+import csv
+import io
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from xml.etree.ElementTree import ParseError
+
+from django.db import transaction
+
+from . import cache
+from .models import Centre, CumulMensuel, Livre, ReleveCentreLivre
+
+COLONNES_OBLIGATOIRES = (
+    "centre",
+    "livre",
+    "date_debut",
+    "date_fin",
+    "quantite_recue",
+    "quantite_vendue",
+)
+
+CLE_UNIQUE = ("centre", "livre", "date_debut", "date_fin")
+
+# champs écrits à l'import (et mis à jour si le relevé existe déjà)
+CHAMPS_MIS_A_JOUR = (
+    "quantite_recue",
+    "quantite_vendue",
+    "prix_unitaire",
+    "depenses",
+    "operateur_mobile_money",
+    "taux_frais_retrait",
+    "montant_frais_retrait",
+    "montant_ventes",
+    "quantite_reste",
+    "modifie_le",
+)
+
+TAILLE_LOT = 1000
+
+
+class ErreurImport(Exception):
+    """Fichier illisible ou colonnes manquantes."""
+
+
+def _normaliser_entete(valeur):
+    return str(valeur or "").strip().lower().replace(" ", "_")
+
+
+def lire_lignes(fichier, nom_fichier):
+    """
+    Itère sur les lignes du fichier sous forme de dicts {colonne: valeur}.
+    XLSX lu en mode read_only (ligne par ligne), CSV en ; ou , (détecté).
+    """
+    if nom_fichier.lower().endswith(".xlsx"):
+        yield from _lire_xlsx(fichier)
+    elif nom_fichier.lower().endswith(".csv"):
+        yield from _lire_csv(fichier)
+    else:
+        raise ErreurImport("Format non pris en charge (fichiers .csv ou .xlsx).")
+
+
+def _lire_xlsx(fichier):
+    # chargé à la demande : importation est importé par l'admin au démarrage
+    import openpyxl
+
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    # fichier corrompu ou pas vraiment un .xlsx : erreur de formulaire /
+    # de commande plutôt qu'une trace (le read_only lit le XML au fil de l'eau)
+    erreurs_fichier = (zipfile.BadZipFile, InvalidFileException, KeyError, ValueError, ParseError)
+    try:
+        wb = openpyxl.load_workbook(fichier, read_only=True, data_only=True)
+    except erreurs_fichier as e:
+        raise ErreurImport(f"Fichier Excel illisible ({e}).") from e
+    try:
+        lignes = wb.active.iter_rows(values_only=True)
+        entetes = [_normaliser_entete(v) for v in next(lignes, ())]
+        _verifier_entetes(entetes)
+        for valeurs in lignes:
+            if not any(v not in (None, "") for v in valeurs):
+                continue
+            yield dict(zip(entetes, valeurs))
+    except erreurs_fichier as e:
+        raise ErreurImport(f"Fichier Excel illisible ({e}).") from e
+    finally:
+        wb.close()
+
+
+def _encodage_csv(fichier):
+    """
+    utf-8 (avec ou sans BOM) si tout le fichier se décode ainsi, sinon
+    Windows-1252 : ce qu'enregistre Excel en français (« Activités »).
+    """
+    decodeur = codecs.getincrementaldecoder("utf-8-sig")()
+    try:
+        for bloc in iter(lambda: fichier.read(1 << 16), b""):
+            decodeur.decode(bloc)
+        decodeur.decode(b"", final=True)
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        return "cp1252"
+    finally:
+        fichier.seek(0)
+
+
+def _lire_csv(fichier):
+    encodage = _encodage_csv(fichier)
+    texte = io.TextIOWrapper(fichier, encoding=encodage, newline="")
+    try:
+        debut = texte.read(4096)
+        texte.seek(0)
+        try:
+            dialecte = csv.Sniffer().sniff(debut, delimiters=";,")
+        except csv.Error:
+            dialecte = csv.excel
+        lecteur = csv.reader(texte, dialecte)
+        entetes = [_normaliser_entete(v) for v in next(lecteur, [])]
+        _verifier_entetes(entetes)
+        for valeurs in lecteur:
+            if not any(v.strip() for v in valeurs):
+                continue
+            yield dict(zip(entetes, valeurs))
+    except (UnicodeDecodeError, csv.Error) as e:
+        # octets indéfinis même en cp1252 (fichier binaire renommé en .csv…)
+        raise ErreurImport(f"Fichier CSV illisible ({e}).") from e
+    finally:
+        # sinon le TextIOWrapper fermerait le fichier de l'appelant
+        texte.detach()
+
+
+def _verifier_entetes(entetes):
+    manquantes = [c for c in COLONNES_OBLIGATOIRES if c not in entetes]
+    if manquantes:
+        raise ErreurImport(f"Colonne(s) manquante(s) : {', '.join(manquantes)}")
+
+
+def _texte(valeur):
+    return str(valeur).strip() if valeur is not None else ""
+
+
+def _date(valeur):
+    if isinstance(valeur, datetime):
+        return valeur.date()
+    if isinstance(valeur, date):
+        return valeur
+    texte = _texte(valeur)
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(texte, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"date invalide « {texte} »")
+
+
+def _decimal(valeur, defaut=None):
+    texte = _texte(valeur).replace("\u00a0", "").replace(" ", "").replace(",", ".")
+    if not texte:
+        return defaut
+    try:
+        return Decimal(texte)
+    except InvalidOperation:
+        raise ValueError(f"nombre invalide « {texte} »")
+
+
+def _entier(valeur):
+    nombre = _decimal(valeur, Decimal("0"))
+    if nombre < 0 or nombre != nombre.to_integral_value():
+        raise ValueError(f"quantité invalide « {_texte(valeur)} »")
+    return int(nombre)
+
+
+def _operateurs():
+    """Code ou libellé (« MTN », « MTN Money »…) -> code opérateur."""
+    correspondances = {}
+    for code, libelle in ReleveCentreLivre.OPERATEUR_CHOICES:
+        correspondances[code.lower()] = code
+        correspondances[libelle.lower()] = code
+    return correspondances
+
+
+class ResultatImport:
+    def __init__(self):
+        self.lignes_ecrites = 0
+        self.erreurs = []  # [(n° de ligne, message)]
+
+    def __str__(self):
+        return f"{self.lignes_ecrites} relevé(s) importé(s), {len(self.erreurs)} ligne(s) rejetée(s)"
+
+
+def importer_releves(fichier, nom_fichier, taille_lot=TAILLE_LOT):
+    """
+    Importe les relevés du fichier. Les lignes invalides sont ignorées et
+    listées dans ResultatImport.erreurs ; les autres sont écrites dans une
+    seule transaction.
+    """
+    centres = {c.nom.strip().lower(): c for c in Centre.objects.all()}
+    livres = {l.code.strip().lower(): l for l in Livre.objects.all()}
+    operateurs = _operateurs()
+
+    resultat = ResultatImport()
+    touches = set()  # (centre_id, date_fin) pour les cumuls et le cache
+    lot = {}
+
+    def ecrire_lot():
+        if not lot:
+            return
+        # livres déjà chargés : pas de requête pour le prix par défaut
+        ReleveCentreLivre.calculer_montants_lot(lot.values())
+        ReleveCentreLivre.objects.bulk_create(
+            lot.values(),
+            update_conflicts=True,
+            unique_fields=CLE_UNIQUE,
+            update_fields=CHAMPS_MIS_A_JOUR,
+        )
+        resultat.lignes_ecrites += len(lot)
+        lot.clear()
+
+    with transaction.atomic():
+        # ligne 1 = en-tête
+        for numero, ligne in enumerate(lire_lignes(fichier, nom_fichier), start=2):
+            try:
+                centre = centres.get(_texte(ligne.get("centre")).lower())
+                if centre is None:
+                    raise ValueError(f"centre inconnu « {_texte(ligne.get('centre'))} »")
+                livre = livres.get(_texte(ligne.get("livre")).lower())
+                if livre is None:
+                    raise ValueError(f"livre inconnu « {_texte(ligne.get('livre'))} »")
+
+                operateur = None
+                if _texte(ligne.get("operateur")):
+                    operateur = operateurs.get(_texte(ligne["operateur"]).lower())
+                    if operateur is None:
+                        raise ValueError(f"opérateur inconnu « {_texte(ligne['operateur'])} »")
+
+                releve = ReleveCentreLivre(
+                    centre=centre,
+                    livre=livre,
+                    date_debut=_date(ligne.get("date_debut")),
+                    date_fin=_date(ligne.get("date_fin")),
+                    quantite_recue=_entier(ligne.get("quantite_recue")),
+                    quantite_vendue=_entier(ligne.get("quantite_vendue")),
+                    prix_unitaire=_decimal(ligne.get("prix_unitaire")),
+                    depenses=_decimal(ligne.get("depenses"), Decimal("0")),
+                    operateur_mobile_money=operateur,
+                    taux_frais_retrait=_decimal(ligne.get("taux_frais_retrait")),
+                )
+                if releve.date_fin < releve.date_debut:
+                    raise ValueError("date_fin antérieure à date_debut")
+            except ValueError as e:
+                resultat.erreurs.append((numero, str(e)))
+                continue
+
+            # même clé deux fois dans le fichier : la dernière ligne l'emporte
+            lot[(centre.pk, livre.pk, releve.date_debut, releve.date_fin)] = releve
+            touches.add((centre.pk, releve.date_fin))
+            if len(lot) >= taille_lot:
+                ecrire_lot()
+        ecrire_lot()
+
+        # bulk_create ne passe pas par save() : cumuls des mois touchés à refaire
+        CumulMensuel.reconstruire({(d.year, d.month) for _, d in touches})
+        transaction.on_commit(lambda: cache.invalider_releves(touches))
+
+    return resultat
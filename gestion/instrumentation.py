@@ -0,0 +1,96 @@
+# gestion/instrumentation.py
+"""
+Mesures par requête (SQL, rendu des gabarits, génération des exports),
+lues par gestion.middleware.ServerTimingMiddleware.
+
+Les mesures de la requête en cours vivent dans une ContextVar : hors
+requête (commandes, worker PDF) elle est vide et mesurer() ne fait rien.
+Dans une vue async, les threads de gestion/asynchrone.py y ajoutent leurs
+requêtes en même temps, d'où le verrou.
+"""
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.template.backends.django import DjangoTemplates
+
+_mesures = ContextVar("gestion_mesures", default=None)
+
+
+class Mesures:
+    """Durées cumulées (secondes) par catégorie + nombre de requêtes SQL."""
+
+    def __init__(self):
+        self.durees = {}
+        self.nb_sql = 0
+        self._verrou = threading.Lock()
+
+    def ajouter(self, categorie, duree):
+        with self._verrou:
+            self.durees[categorie] = self.durees.get(categorie, 0.0) + duree
+
+    def ajouter_sql(self, duree):
+        with self._verrou:
+            self.durees["sql"] = self.durees.get("sql", 0.0) + duree
+            self.nb_sql += 1
+
+
+def demarrer():
+    """Ouvre les mesures d'une requête ; retourne (mesures, jeton pour terminer)."""
+    mesures = Mesures()
+    return mesures, _mesures.set(mesures)
+
+
+def terminer(jeton):
+    _mesures.reset(jeton)
+
+
+@contextmanager
+def mesurer(categorie):
+    """Ajoute la durée du bloc à la catégorie (« excel », « pdf »…) de la requête en cours."""
+    mesures = _mesures.get()
+    if mesures is None:
+        yield
+        return
+    debut = perf_counter()
+    try:
+        yield
+    finally:
+        mesures.ajouter(categorie, perf_counter() - debut)
+
+
+def chronometrer_sql(execute, sql, params, many, context):
+    """execute_wrapper : compte et chronomètre chaque requête SQL."""
+    mesures = _mesures.get()
+    if mesures is None:
+        return execute(sql, params, many, context)
+    debut = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        mesures.ajouter_sql(perf_counter() - debut)
+
+
+class GabaritMesure:
+    """Enveloppe d'un gabarit : chronomètre render() (les include sont comptés dedans)."""
+
+    def __init__(self, gabarit):
+        self._gabarit = gabarit
+
+    def __getattr__(self, nom):
+        return getattr(self._gabarit, nom)
+
+    def render(self, context=None, request=None):
+        with mesurer("gabarit"):
+            return self._gabarit.render(context, request)
+
+
+class DjangoTemplatesMesures(DjangoTemplates):
+    """Moteur DjangoTemplates dont les rendus sont mesurés (voir TEMPLATES)."""
+
+    def from_string(self, template_code):
+        return GabaritMesure(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return GabaritMesure(super().get_template(template_name))
@@ -0,0 +1,71 @@
+import tempfile
+import tracemalloc
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from gestion.models import Centre, Livre
+from gestion.rapports import RapportResultat, construire_lignes
+from gestion.excel import ecrire_classeur_via_act
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure (tracemalloc) la mémoire de l'export Excel VIAT/ACT pour un "
+        "nombre croissant de centres fictifs (aucun accès base) : données du "
+        "rapport, pic total et surcoût de l'écriture du classeur."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--centres",
+            type=int,
+            nargs="+",
+            default=[100, 1000, 10000, 50000],
+            help="Tailles à mesurer (nombre de centres).",
+        )
+
+    def _resultat(self, nb_centres):
+        livres = [
+            Livre(pk=1, code="VIATIQUE", nom="Viatique", prix_unitaire_defaut=Decimal("1000")),
+            Livre(pk=2, code="ACTIVITES", nom="Activités", prix_unitaire_defaut=Decimal("800")),
+        ]
+        centres = [Centre(pk=i, nom=f"CENTRE {i:06d}") for i in range(1, nb_centres + 1)]
+        agregats = {
+            (centre.pk, livre.pk): {
+                "q_recue": 120,
+                "q_vendue": 100,
+                "reste": 20,
+                "montant": Decimal("100000.00"),
+                "dep": Decimal("2500.00"),
+            }
+            for centre in centres
+            for livre in livres
+        }
+        return RapportResultat(livres, construire_lignes(centres, livres, agregats))
+
+    def handle(self, *args, **options):
+        # tracemalloc démarre avant la construction du résultat : « pic total »
+        # compte aussi la matrice d'entrée (RapportResultat), qui grandit avec
+        # le nombre de centres ; seul le surcoût de l'export reste borné
+        self.stdout.write(
+            f"{'centres':>10} {'fichier (Ko)':>14} {'données (Ko)':>14} "
+            f"{'pic total (Ko)':>16} {'surcoût export (Ko)':>21}"
+        )
+        for nb_centres in options["centres"]:
+            tracemalloc.start()
+            resultat = self._resultat(nb_centres)
+            donnees, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+
+            with tempfile.TemporaryFile() as fichier:
+                ecrire_classeur_via_act([("Bench", resultat)], fichier)
+                taille = fichier.tell()
+            _, pic = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            del resultat
+
+            self.stdout.write(
+                f"{nb_centres:>10} {taille // 1024:>14} {donnees // 1024:>14} "
+                f"{pic // 1024:>16} {(pic - donnees) // 1024:>21}"
+            )
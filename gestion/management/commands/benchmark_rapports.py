@@ -0,0 +1,206 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from pathlib import Path
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from gestion import exports
+from gestion.models import Centre, Livre, ReleveCentreLivre
+
+
+def _pages(annee, semaine, mois, trimestre):
+    """(nom, url) de chaque page mesurée, sur la dernière période avec des relevés."""
+    return [
+        ("dashboard", "/"),
+        ("releves", "/releves/"),
+        ("releves_filtre_total", f"/releves/?operateur=MTN&du={annee}-01-01&total=1"),
+        ("rapport_semaine", f"/rapports/semaine/?year={annee}&week={semaine}"),
+        ("rapport_mois", f"/rapports/mois/?year={annee}&month={mois}"),
+        ("rapport_trimestre", f"/rapports/trimestre/?year={annee}&quarter={trimestre}"),
+        ("rapport_annee", f"/rapports/annee/?year={annee}"),
+        ("rapport_global", "/rapports/global/"),
+        ("excel_mois", f"/rapports/mois/export-excel/?year={annee}&month={mois}"),
+        ("excel_trimestre", f"/rapports/trimestre/export-excel/?year={annee}&quarter={trimestre}"),
+        ("excel_annee", f"/rapports/annee/export-excel/?year={annee}"),
+        ("excel_global", "/rapports/global/export-excel/"),
+        ("pdf_mois", f"/rapports/mois/export-pdf/?year={annee}&month={mois}"),
+        ("pdf_trimestre", f"/rapports/trimestre/export-pdf/?year={annee}&quarter={trimestre}"),
+        ("pdf_annee", f"/rapports/annee/export-pdf/?year={annee}"),
+    ]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Chronomètre les pages de rapports, exports et listes avec le client de "
+        "test Django (requêtes SQL, temps, pic mémoire) et écrit un résultat "
+        "JSON + Markdown comparable d'une exécution à l'autre."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repetitions",
+            type=int,
+            default=5,
+            help="Mesures « à chaud » par page, après la première (défaut : 5).",
+        )
+        parser.add_argument(
+            "--sortie",
+            default="benchmark_rapports",
+            help="Chemin sans extension des fichiers .json et .md (défaut : benchmark_rapports).",
+        )
+        parser.add_argument(
+            "--comparer",
+            help="Résultat JSON d'une exécution précédente : affiche l'écart par page.",
+        )
+
+    def _utilisateurs(self):
+        User = get_user_model()
+        centre = Centre.objects.order_by("nom").first()
+        admin, _ = User.objects.get_or_create(
+            username="bench_admin",
+            defaults={"role": User.ROLE_ADMIN},
+        )
+        utilisateur_centre, _ = User.objects.get_or_create(
+            username="bench_centre",
+            defaults={"role": User.ROLE_CENTRE, "centre": centre},
+        )
+        return [("admin", admin), ("centre", utilisateur_centre)]
+
+    def _mesurer(self, client, url):
+        """Une requête : (statut, nb requêtes SQL, secondes, octets)."""
+        with CaptureQueriesContext(connection) as requetes:
+            debut = time.perf_counter()
+            response = client.get(url)
+            if response.streaming:
+                taille = sum(len(morceau) for morceau in response.streaming_content)
+            else:
+                taille = len(response.content)
+            duree = time.perf_counter() - debut
+            response.close()
+        return response.status_code, len(requetes.captured_queries), duree, taille
+
+    def _pic_memoire(self, client, url):
+        cache.clear()
+        exports.purger_cache(0)
+        tracemalloc.start()
+        response = client.get(url)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        response.close()
+        _, pic = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return pic
+
+    def handle(self, *args, **options):
+        derniere = ReleveCentreLivre.objects.aggregate(d=Max("date_fin"))["d"]
+        if derniere is None:
+            raise CommandError("Aucun relevé : lancer d'abord generer_donnees.")
+        iso = derniere.isocalendar()
+        pages = _pages(derniere.year, iso.week, derniere.month, (derniere.month - 1) // 3 + 1)
+
+        resultat = {
+            "date": timezone.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "base": connection.vendor,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "echelle": {
+                "centres": Centre.objects.count(),
+                "livres": Livre.objects.count(),
+                "releves": ReleveCentreLivre.objects.count(),
+            },
+            "repetitions": options["repetitions"],
+            "mesures": {},
+        }
+
+        # PDF rendus dans la requête : c'est le rendu qu'on veut chronométrer
+        with override_settings(ALLOWED_HOSTS=["*"], EXPORTS_PDF_EN_ARRIERE_PLAN=False):
+            for profil, utilisateur in self._utilisateurs():
+                client = Client()
+                client.force_login(utilisateur)
+                for nom, url in pages:
+                    cache.clear()
+                    exports.purger_cache(0)
+                    statut, nb_froid, froid, taille = self._mesurer(client, url)
+                    chauds = [self._mesurer(client, url) for _ in range(options["repetitions"])]
+                    cle = f"{profil}:{nom}"
+                    resultat["mesures"][cle] = {
+                        "url": url,
+                        "statut": statut,
+                        "octets": taille,
+                        "requetes_froid": nb_froid,
+                        "ms_froid": round(froid * 1000, 2),
+                        "requetes_chaud": chauds[-1][1] if chauds else nb_froid,
+                        "ms_chaud_median": round(
+                            statistics.median(m[2] for m in chauds) * 1000, 2
+                        ) if chauds else None,
+                        "pic_memoire_ko": self._pic_memoire(client, url) // 1024,
+                    }
+                    self.stdout.write(
+                        f"{cle:<32} {statut} {nb_froid:>4} req {froid * 1000:>9.1f} ms"
+                    )
+
+        sortie = Path(options["sortie"])
+        sortie.with_suffix(".json").write_text(json.dumps(resultat, indent=2, ensure_ascii=False))
+        ancien = None
+        if options["comparer"]:
+            ancien = json.loads(Path(options["comparer"]).read_text())
+        sortie.with_suffix(".md").write_text(self._markdown(resultat, ancien))
+        self.stdout.write(self.style.SUCCESS(
+            f"Résultats écrits dans {sortie.with_suffix('.json')} et {sortie.with_suffix('.md')}"
+        ))
+
+    def _markdown(self, resultat, ancien=None):
+        echelle = resultat["echelle"]
+        lignes = [
+            f"# Benchmark rapports — {resultat['date']}",
+            "",
+            f"- commit : {resultat['commit'] or '?'} — base : {resultat['base']} — "
+            f"Python {resultat['python']}, Django {resultat['django']}",
+            f"- échelle : {echelle['centres']} centres, {echelle['livres']} livres, "
+            f"{echelle['releves']} relevés",
+            f"- {resultat['repetitions']} mesure(s) à chaud par page, caches (dont exports sur disque) vidés avant la mesure à froid",
+            "",
+            "| page | statut | req. froid | ms froid | req. chaud | ms chaud (médiane) | pic mém. (Ko) |"
+            + (" écart ms froid |" if ancien else ""),
+            "|---|---|---|---|---|---|---|" + ("---|" if ancien else ""),
+        ]
+        for cle, m in resultat["mesures"].items():
+            ligne = (
+                f"| {cle} | {m['statut']} | {m['requetes_froid']} | {m['ms_froid']} | "
+                f"{m['requetes_chaud']} | {m['ms_chaud_median']} | {m['pic_memoire_ko']} |"
+            )
+            if ancien:
+                avant = ancien["mesures"].get(cle)
+                if avant and avant["ms_froid"]:
+                    ecart = (m["ms_froid"] - avant["ms_froid"]) / avant["ms_froid"] * 100
+                    ligne += f" {ecart:+.0f} % |"
+                else:
+                    ligne += " — |"
+            lignes.append(ligne)
+        if ancien and ancien.get("echelle") != echelle:
+            lignes += ["", f"Attention : échelle différente de la référence ({ancien.get('echelle')})."]
+        return "\n".join(lignes) + "\n"
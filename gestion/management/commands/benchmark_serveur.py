@@ -0,0 +1,237 @@
+import http.client
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.test import Client
+
+from gestion.models import ReleveCentreLivre
+
+# profils comparés : (fichier de configuration gunicorn, variables
+# d'environnement) ; None = aucun fichier, les réglages par défaut que
+# lançait render.yaml (un seul worker sync)
+PROFILS = {
+    "defaut": (None, {}),
+    "production": ("gunicorn.conf.py", {}),
+    # mêmes réglages, application ASGI et vues async (workers uvicorn)
+    "asgi": ("gunicorn.conf.py", {"GUNICORN_ASGI": "True"}),
+}
+
+
+def _charge(annee, nb_mois, exports=True):
+    """(poids, nom, url) : pages de rapport surtout, quelques exports Excel / PDF."""
+    mois = range(1, nb_mois + 1)
+    pages = [
+        (30, "dashboard", ["/"]),
+        (25, "rapport_mois", [f"/rapports/mois/?year={annee}&month={m}" for m in mois]),
+        (15, "rapport_annee", [f"/rapports/annee/?year={annee}"]),
+        (15, "releves", ["/releves/"]),
+        (10, "excel_mois", [f"/rapports/mois/export-excel/?year={annee}&month={m}" for m in mois]),
+        (5, "pdf_mois", [f"/rapports/mois/export-pdf/?year={annee}&month={m}" for m in mois]),
+    ]
+    if not exports:
+        pages = [page for page in pages if not page[1].startswith(("excel", "pdf"))]
+    return pages
+
+
+def _port_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(valeurs, p):
+    valeurs = sorted(valeurs)
+    if not valeurs:
+        return None
+    return valeurs[min(len(valeurs) - 1, int(round(p / 100 * (len(valeurs) - 1))))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Test de charge local : lance gunicorn avec le profil par défaut, avec "
+        "gunicorn.conf.py (WSGI) puis en ASGI, envoie le même mélange de rapports "
+        "et d'exports avec plusieurs clients simultanés, et compare débit et "
+        "latence p95."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=8, help="Clients simultanés (défaut : 8).")
+        parser.add_argument("--duree", type=int, default=20, help="Durée par profil en secondes (défaut : 20).")
+        parser.add_argument(
+            "--profils",
+            nargs="+",
+            choices=list(PROFILS),
+            default=list(PROFILS),
+            help="Profils à mesurer (défaut : tous).",
+        )
+        parser.add_argument(
+            "--sans-exports",
+            action="store_true",
+            help="Pages de rapport et dashboard seulement (pour comparer WSGI / ASGI).",
+        )
+        parser.add_argument("--graine", type=int, default=1, help="Graine du tirage des URL.")
+        parser.add_argument("--sortie", help="Fichier JSON où écrire les mesures (optionnel).")
+
+    def _cookie_session(self):
+        User = get_user_model()
+        utilisateur, _ = User.objects.get_or_create(
+            username="bench_admin",
+            defaults={"role": User.ROLE_ADMIN},
+        )
+        client = Client()
+        client.force_login(utilisateur)
+        cookie = client.cookies[settings.SESSION_COOKIE_NAME].value
+        return f"{settings.SESSION_COOKIE_NAME}={cookie}"
+
+    def _demarrer(self, profil, port, dossier_exports):
+        env = os.environ.copy()
+        configuration, variables = PROFILS[profil]
+        env.update(variables)
+        env.update({
+            "PORT": str(port),
+            # PDF rendus dans la requête : c'est ce qui bloque un worker sync
+            "EXPORTS_PDF_EN_ARRIERE_PLAN": "False",
+            # cache d'exports vide pour chaque profil
+            "EXPORTS_CACHE_DIR": dossier_exports,
+            "PERF_LOG_LEVEL": "WARNING",
+            "GUNICORN_LOG_LEVEL": "warning",
+        })
+        commande = [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}"]
+        if configuration is None:
+            # fichier vide : sinon gunicorn charge ./gunicorn.conf.py tout seul
+            vide = os.path.join(dossier_exports, "vide.conf.py")
+            Path(vide).touch()
+            module, _, nom = settings.WSGI_APPLICATION.rpartition(".")
+            commande += ["--config", vide, f"{module}:{nom}"]
+        else:
+            # l'application (WSGI ou ASGI) est donnée par le fichier
+            commande += ["--config", configuration]
+        processus = subprocess.Popen(commande, cwd=settings.BASE_DIR, env=env)
+        limite = time.monotonic() + 30
+        while time.monotonic() < limite:
+            try:
+                connexion = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+                connexion.request("GET", "/login/")
+                connexion.getresponse().read()
+                return processus
+            except OSError:
+                time.sleep(0.2)
+        processus.terminate()
+        raise CommandError(f"gunicorn ({profil}) n'a pas répondu en 30 s.")
+
+    def _client(self, port, cookie, tirage, fin, resultats, verrou):
+        connexion = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+        entetes = {"Cookie": cookie, "Host": "localhost"}
+        while time.monotonic() < fin:
+            with verrou:
+                nom, url = next(tirage)
+            debut = time.perf_counter()
+            try:
+                connexion.request("GET", url, headers=entetes)
+                reponse = connexion.getresponse()
+                reponse.read()
+                ok = reponse.status == 200
+            except (OSError, http.client.HTTPException):
+                connexion.close()
+                connexion = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+                ok = False
+            duree = time.perf_counter() - debut
+            with verrou:
+                resultats.append((nom, duree, ok))
+        connexion.close()
+
+    def _mesurer(self, profil, cookie, charge, options):
+        rng = random.Random(options["graine"])
+        poids = [p for p, _, _ in charge]
+
+        def urls():
+            while True:
+                _, nom, candidates = rng.choices(charge, weights=poids)[0]
+                yield nom, rng.choice(candidates)
+
+        port = _port_libre()
+        with tempfile.TemporaryDirectory() as dossier_exports:
+            processus = self._demarrer(profil, port, dossier_exports)
+            try:
+                resultats = []
+                verrou = threading.Lock()
+                tirage = urls()
+                debut = time.monotonic()
+                fin = debut + options["duree"]
+                clients = [
+                    threading.Thread(
+                        target=self._client,
+                        args=(port, cookie, tirage, fin, resultats, verrou),
+                    )
+                    for _ in range(options["clients"])
+                ]
+                for t in clients:
+                    t.start()
+                for t in clients:
+                    t.join()
+                ecoule = time.monotonic() - debut
+            finally:
+                processus.terminate()
+                processus.wait(timeout=30)
+
+        durees = [d for _, d, ok in resultats if ok]
+        par_page = {}
+        for nom, duree, ok in resultats:
+            if ok:
+                par_page.setdefault(nom, []).append(duree)
+        return {
+            "requetes": len(resultats),
+            "erreurs": sum(1 for _, _, ok in resultats if not ok),
+            "req_par_s": round(len(durees) / ecoule, 2),
+            "p50_ms": round(statistics.median(durees) * 1000, 1) if durees else None,
+            "p95_ms": round(_percentile(durees, 95) * 1000, 1) if durees else None,
+            "p95_par_page_ms": {
+                nom: round(_percentile(d, 95) * 1000, 1) for nom, d in sorted(par_page.items())
+            },
+        }
+
+    def handle(self, *args, **options):
+        derniere = ReleveCentreLivre.objects.aggregate(d=Max("date_fin"))["d"]
+        if derniere is None:
+            raise CommandError("Aucun relevé : lancer d'abord generer_donnees.")
+        charge = _charge(derniere.year, derniere.month, not options["sans_exports"])
+        cookie = self._cookie_session()
+
+        resultats = {}
+        for profil in options["profils"]:
+            self.stdout.write(f"Profil « {profil} » : {options['clients']} clients, {options['duree']} s…")
+            resultats[profil] = self._mesurer(profil, cookie, charge, options)
+
+        self.stdout.write("")
+        self.stdout.write(f"{'profil':<12} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'erreurs':>8}")
+        for profil, r in resultats.items():
+            self.stdout.write(
+                f"{profil:<12} {r['req_par_s']:>8} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['erreurs']:>8}"
+            )
+        pages = sorted({nom for r in resultats.values() for nom in r["p95_par_page_ms"]})
+        self.stdout.write("")
+        self.stdout.write("p95 par page (ms) : " + " / ".join(resultats))
+        for nom in pages:
+            valeurs = [str(r["p95_par_page_ms"].get(nom, "—")) for r in resultats.values()]
+            self.stdout.write(f"  {nom:<16} {' / '.join(valeurs)}")
+
+        if options["sortie"]:
+            Path(options["sortie"]).write_text(json.dumps({
+                "clients": options["clients"],
+                "duree_s": options["duree"],
+                "cpu": os.cpu_count(),
+                "profils": resultats,
+            }, indent=2, ensure_ascii=False))
@@ -0,0 +1,128 @@
+import json
+import statistics
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from gestion.models import Centre, ReleveCentreLivre
+
+# profils comparés : réglages appliqués par-dessus settings.py ; « actuel »
+# garde ceux de settings.py (cache partagé, sessions cached_db)
+PROFILS = {
+    "avant": {
+        # réglages d'avant : cache local au processus, sessions en base
+        "CACHES": {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+        "SESSION_ENGINE": "django.contrib.sessions.backends.db",
+        # un seul processus ici : rapports en cache comme avec « actuel »
+        "RAPPORTS_CACHE_LOCAL": True,
+    },
+    "actuel": {},
+}
+
+
+def _pages(annee, mois):
+    return [
+        ("dashboard", "/"),
+        ("releves", "/releves/"),
+        ("rapport_mois", f"/rapports/mois/?year={annee}&month={mois}"),
+        ("rapport_annee", f"/rapports/annee/?year={annee}"),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Requêtes SQL par requête HTTP authentifiée, dont celles sur la table des "
+        "sessions, avec les réglages d'avant (sessions en base, cache local) et "
+        "ceux de settings.py (sessions cached_db sur le cache partagé)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repetitions",
+            type=int,
+            default=20,
+            help="Requêtes mesurées par page, après une première qui remplit les caches (défaut : 20).",
+        )
+        parser.add_argument("--sortie", help="Fichier JSON où écrire les mesures (optionnel).")
+
+    def _utilisateurs(self):
+        User = get_user_model()
+        admin, _ = User.objects.get_or_create(
+            username="bench_admin",
+            defaults={"role": User.ROLE_ADMIN},
+        )
+        utilisateur_centre, _ = User.objects.get_or_create(
+            username="bench_centre",
+            defaults={"role": User.ROLE_CENTRE, "centre": Centre.objects.order_by("nom").first()},
+        )
+        return [("admin", admin), ("centre", utilisateur_centre)]
+
+    def _mesurer(self, client, url):
+        """Une requête : (statut, nb requêtes SQL, dont sessions, secondes)."""
+        with CaptureQueriesContext(connection) as requetes:
+            debut = time.perf_counter()
+            response = client.get(url)
+            duree = time.perf_counter() - debut
+        sessions = sum("django_session" in q["sql"] for q in requetes.captured_queries)
+        return response.status_code, len(requetes.captured_queries), sessions, duree
+
+    def _profil(self, pages, repetitions):
+        cache.clear()
+        mesures = {}
+        for nom_utilisateur, utilisateur in self._utilisateurs():
+            # client créé sous le profil : le SessionMiddleware lit SESSION_ENGINE
+            client = Client()
+            client.force_login(utilisateur)
+            for nom, url in pages:
+                self._mesurer(client, url)
+                serie = [self._mesurer(client, url) for _ in range(repetitions)]
+                mesures[f"{nom_utilisateur}:{nom}"] = {
+                    "statut": serie[-1][0],
+                    "requetes": statistics.mean(m[1] for m in serie),
+                    "requetes_session": statistics.mean(m[2] for m in serie),
+                    "ms_median": round(statistics.median(m[3] for m in serie) * 1000, 2),
+                }
+        return mesures
+
+    def handle(self, *args, **options):
+        derniere = ReleveCentreLivre.objects.aggregate(d=Max("date_fin"))["d"]
+        if derniere is None:
+            raise CommandError("Aucun relevé : lancer d'abord generer_donnees.")
+        pages = _pages(derniere.year, derniere.month)
+
+        resultats = {}
+        for profil, reglages in PROFILS.items():
+            with override_settings(ALLOWED_HOSTS=["*"], **reglages):
+                resultats[profil] = self._profil(pages, options["repetitions"])
+            cache.clear()
+
+        self.stdout.write(
+            f"cache : {settings.CACHES['default']['BACKEND'].rsplit('.', 1)[-1]}, "
+            f"sessions : {settings.SESSION_ENGINE.rsplit('.', 1)[-1]}"
+        )
+        self.stdout.write(
+            f"{'page':<22} {'req. avant':>10} {'(sessions)':>10} {'req. actuel':>11} "
+            f"{'(sessions)':>10} {'ms avant':>9} {'ms actuel':>9}"
+        )
+        for cle, avant in resultats["avant"].items():
+            actuel = resultats["actuel"][cle]
+            self.stdout.write(
+                f"{cle:<22} {avant['requetes']:>10.1f} {avant['requetes_session']:>10.1f} "
+                f"{actuel['requetes']:>11.1f} {actuel['requetes_session']:>10.1f} "
+                f"{avant['ms_median']:>9} {actuel['ms_median']:>9}"
+            )
+
+        if options["sortie"]:
+            Path(options["sortie"]).write_text(json.dumps({
+                "repetitions": options["repetitions"],
+                "base": connection.vendor,
+                "profils": resultats,
+            }, indent=2, ensure_ascii=False))
@@ -0,0 +1,182 @@
+import json
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max
+
+from gestion.models import ReleveCentreLivre
+
+# Exécuté dans un processus neuf par lecteur / écrivain (comme des workers
+# gunicorn) ; profil choisi par SQLITE_PERFORMANCES dans l'environnement.
+SCRIPT_ENFANT = r"""
+import json, random, sys, time
+import django
+django.setup()
+
+from django.db import OperationalError
+from gestion.models import ReleveCentreLivre
+from gestion.pagination import page_releves
+from gestion.rapports import MOIS, SEMAINE, ReportSpec
+
+role, debut, fin, graine, annee, mois, semaine = sys.argv[1:8]
+debut, fin = float(debut), float(fin)
+rng = random.Random(int(graine))
+annee, mois, semaine = int(annee), int(mois), int(semaine)
+
+def lire():
+    # ce que fait une page de rapport / la liste, sans le cache
+    ReportSpec(SEMAINE, annee, semaine).calculer()
+    ReportSpec(MOIS, annee, mois).calculer()
+    page_releves(ReleveCentreLivre.objects.select_related("centre", "livre"))
+
+ids = list(ReleveCentreLivre.objects.filter(date_fin__year=annee).values_list("pk", flat=True))
+
+def ecrire():
+    # comme releve_update : save() met aussi à jour le cumul mensuel
+    releve = ReleveCentreLivre.objects.get(pk=rng.choice(ids))
+    releve.quantite_vendue = rng.randint(0, releve.quantite_recue)
+    releve.save()
+
+operation = lire if role == "lecteur" else ecrire
+durees, verrous = [], 0
+time.sleep(max(0.0, debut - time.time()))
+while time.time() < fin:
+    t0 = time.perf_counter()
+    try:
+        operation()
+    except OperationalError as e:
+        if "locked" not in str(e):
+            raise
+        verrous += 1
+        continue
+    durees.append(time.perf_counter() - t0)
+print(json.dumps({"role": role, "durees": durees, "verrous": verrous}), flush=True)
+"""
+
+PROFILS = {
+    "defaut": "False",
+    "performances": "True",
+}
+
+
+def _percentile(valeurs, p):
+    valeurs = sorted(valeurs)
+    if not valeurs:
+        return None
+    return valeurs[min(len(valeurs) - 1, int(round(p / 100 * (len(valeurs) - 1))))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Lecteurs (rapports, liste) et écrivains (modification de relevés) en "
+        "parallèle sur une copie de la base SQLite, sans puis avec le profil "
+        "SQLITE_PERFORMANCES : débit, latence p95 et erreurs « database is locked »."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lecteurs", type=int, default=4, help="Processus lecteurs (défaut : 4).")
+        parser.add_argument("--ecrivains", type=int, default=2, help="Processus écrivains (défaut : 2).")
+        parser.add_argument("--duree", type=int, default=15, help="Durée par profil en secondes (défaut : 15).")
+        parser.add_argument("--sortie", help="Fichier JSON où écrire les mesures (optionnel).")
+
+    def _copier_base(self, destination, profil):
+        # API de sauvegarde : copie cohérente même si la source est en WAL
+        source = sqlite3.connect(settings.DATABASES["default"]["NAME"])
+        copie = sqlite3.connect(destination)
+        with copie:
+            source.backup(copie)
+        source.close()
+        if profil == "defaut":
+            # WAL est enregistré dans le fichier : on repart du journal par défaut
+            copie.execute("PRAGMA journal_mode = DELETE")
+        copie.close()
+
+    def _mesurer(self, profil, periode, options):
+        with tempfile.TemporaryDirectory() as dossier:
+            base = os.path.join(dossier, "bench.sqlite3")
+            self._copier_base(base, profil)
+            env = os.environ.copy()
+            env.update({
+                "DATABASE_URL": f"sqlite:///{base}",
+                "SQLITE_PERFORMANCES": PROFILS[profil],
+                "DJANGO_CACHE_DIR": os.path.join(dossier, "cache"),
+                "PERF_LOG_LEVEL": "WARNING",
+            })
+            # le temps que chaque processus charge Django avant de démarrer ensemble
+            debut = time.time() + 5
+            fin = debut + options["duree"]
+            roles = ["lecteur"] * options["lecteurs"] + ["ecrivain"] * options["ecrivains"]
+            processus = [
+                subprocess.Popen(
+                    [sys.executable, "-c", SCRIPT_ENFANT, role, str(debut), str(fin), str(i), *periode],
+                    cwd=settings.BASE_DIR,
+                    env=env,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                )
+                for i, role in enumerate(roles)
+            ]
+            mesures = []
+            for p in processus:
+                sortie, erreurs = p.communicate()
+                if p.returncode != 0:
+                    raise CommandError(f"Un processus de mesure a échoué :\n{erreurs}")
+                mesures.append(json.loads(sortie))
+
+        resultat = {}
+        for role in ("lecteur", "ecrivain"):
+            durees = [d for m in mesures if m["role"] == role for d in m["durees"]]
+            resultat[role] = {
+                "operations": len(durees),
+                "par_s": round(len(durees) / options["duree"], 1),
+                "p50_ms": round(statistics.median(durees) * 1000, 1) if durees else None,
+                "p95_ms": round(_percentile(durees, 95) * 1000, 1) if durees else None,
+                "verrous": sum(m["verrous"] for m in mesures if m["role"] == role),
+            }
+        return resultat
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Ce benchmark ne concerne que SQLite (DATABASE_URL=sqlite:///…).")
+        derniere = ReleveCentreLivre.objects.aggregate(d=Max("date_fin"))["d"]
+        if derniere is None:
+            raise CommandError("Aucun relevé : lancer d'abord generer_donnees.")
+        periode = [str(derniere.year), str(derniere.month), str(derniere.isocalendar().week)]
+
+        resultats = {}
+        for profil in PROFILS:
+            self.stdout.write(
+                f"Profil « {profil} » : {options['lecteurs']} lecteurs, "
+                f"{options['ecrivains']} écrivains, {options['duree']} s…"
+            )
+            resultats[profil] = self._mesurer(profil, periode, options)
+
+        self.stdout.write("")
+        self.stdout.write(
+            f"{'profil':<14} {'role':<9} {'op/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'« locked »':>11}"
+        )
+        for profil, r in resultats.items():
+            for role, m in r.items():
+                self.stdout.write(
+                    f"{profil:<14} {role:<9} {m['par_s']:>7} {m['p50_ms']!s:>8} "
+                    f"{m['p95_ms']!s:>8} {m['verrous']:>11}"
+                )
+
+        if options["sortie"]:
+            Path(options["sortie"]).write_text(json.dumps({
+                "lecteurs": options["lecteurs"],
+                "ecrivains": options["ecrivains"],
+                "duree_s": options["duree"],
+                "cpu": os.cpu_count(),
+                "profils": resultats,
+            }, indent=2, ensure_ascii=False))
@@ -0,0 +1,149 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from gestion import cache
+from gestion.models import Centre, CumulMensuel, Livre, ReleveCentreLivre
+
+# (code, nom) des premiers livres : ceux que cherchent les exports VIAT/ACT
+LIVRES_DE_BASE = [
+    ("VIATIQUE", "Viatique"),
+    ("ACTIVITES", "Activités"),
+    ("COMPAGNON_180", "Compagnon"),
+    ("CANTIQUES", "Cantiques"),
+]
+
+# part de chaque opérateur Mobile Money dans les relevés générés
+OPERATEURS = [
+    (None, 30),
+    (ReleveCentreLivre.OPERATEUR_MTN, 30),
+    (ReleveCentreLivre.OPERATEUR_ORANGE, 20),
+    (ReleveCentreLivre.OPERATEUR_MOOV, 10),
+    (ReleveCentreLivre.OPERATEUR_WAVE, 10),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère des données de test réalistes (centres, livres, relevés "
+        "hebdomadaires) pour les benchmarks. Même graine = mêmes données."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--centres", type=int, default=20, help="Nombre de centres (défaut : 20).")
+        parser.add_argument("--livres", type=int, default=4, help="Nombre de livres (défaut : 4).")
+        parser.add_argument("--releves", type=int, default=10000, help="Nombre de relevés (défaut : 10000).")
+        parser.add_argument("--annees", type=int, default=2, help="Historique couvert, en années (défaut : 2).")
+        parser.add_argument("--graine", type=int, default=42, help="Graine du générateur aléatoire.")
+        parser.add_argument(
+            "--vider",
+            action="store_true",
+            help="Supprimer d'abord TOUS les relevés, centres et livres existants.",
+        )
+
+    def _livres(self, nombre, rng):
+        livres = []
+        for i in range(nombre):
+            if i < len(LIVRES_DE_BASE):
+                code, nom = LIVRES_DE_BASE[i]
+            else:
+                code, nom = f"LIVRE_{i + 1:03d}", f"Livre {i + 1:03d}"
+            livre, _ = Livre.objects.get_or_create(
+                code=code,
+                defaults={
+                    "nom": nom,
+                    "pages": rng.choice([96, 120, 180, 240]),
+                    "prix_unitaire_defaut": Decimal(rng.choice([500, 1000, 1500, 2000])),
+                },
+            )
+            livres.append(livre)
+        return livres
+
+    def _centres(self, nombre):
+        existants = {c.nom: c for c in Centre.objects.filter(nom__startswith="CENTRE ")}
+        noms = [f"CENTRE {i:04d}" for i in range(1, nombre + 1)]
+        Centre.objects.bulk_create(
+            [Centre(nom=nom, ville="Abidjan") for nom in noms if nom not in existants]
+        )
+        centres = {c.nom: c for c in Centre.objects.filter(nom__in=noms)}
+        return [centres[nom] for nom in noms]
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["graine"])
+        debut_chrono = time.monotonic()
+
+        nb_semaines = max(1, options["annees"] * 52)
+        with transaction.atomic():
+            if options["vider"]:
+                ReleveCentreLivre.objects.all().delete()
+                CumulMensuel.objects.all().delete()
+                Centre.objects.all().delete()
+                Livre.objects.all().delete()
+
+            livres = self._livres(options["livres"], rng)
+            centres = self._centres(options["centres"])
+
+            # une case = (semaine, centre, livre) ; la clé unique du relevé
+            # interdit deux relevés sur la même case
+            nb_cases = nb_semaines * len(centres) * len(livres)
+            if options["releves"] > nb_cases:
+                raise CommandError(
+                    f"Au plus {nb_cases} relevés pour {len(centres)} centres, "
+                    f"{len(livres)} livres et {nb_semaines} semaines."
+                )
+
+            # semaines ISO complètes (lundi → dimanche) finissant avant aujourd'hui
+            aujourd_hui = timezone.now().date()
+            dernier_lundi = aujourd_hui - timedelta(days=aujourd_hui.weekday() + 7)
+            premier_lundi = dernier_lundi - timedelta(weeks=nb_semaines - 1)
+
+            operateurs = [op for op, _ in OPERATEURS]
+            poids = [p for _, p in OPERATEURS]
+            lot = []
+            for case in rng.sample(range(nb_cases), options["releves"]):
+                semaine, reste = divmod(case, len(centres) * len(livres))
+                centre = centres[reste // len(livres)]
+                livre = livres[reste % len(livres)]
+                date_debut = premier_lundi + timedelta(weeks=semaine)
+
+                quantite_recue = rng.randint(0, 600)
+                releve = ReleveCentreLivre(
+                    centre=centre,
+                    livre=livre,
+                    date_debut=date_debut,
+                    date_fin=date_debut + timedelta(days=6),
+                    quantite_recue=quantite_recue,
+                    quantite_vendue=rng.randint(0, quantite_recue),
+                    # le plus souvent le prix du livre, parfois un prix remisé
+                    prix_unitaire=(
+                        livre.prix_unitaire_defaut
+                        if rng.random() < 0.8
+                        else (livre.prix_unitaire_defaut * Decimal("0.9")).quantize(Decimal("1"))
+                    ),
+                    depenses=Decimal(rng.choice([0, 0, 500, 1000, 2500, 5000])),
+                    operateur_mobile_money=rng.choices(operateurs, poids)[0],
+                )
+                lot.append(releve)
+                if len(lot) >= 1000:
+                    ReleveCentreLivre.calculer_montants_lot(lot)
+                    ReleveCentreLivre.objects.bulk_create(lot, ignore_conflicts=True)
+                    lot = []
+            ReleveCentreLivre.calculer_montants_lot(lot)
+            ReleveCentreLivre.objects.bulk_create(lot, ignore_conflicts=True)
+
+            # bulk_create ne passe pas par save() : cumuls et cache à refaire
+            nb_cumuls = CumulMensuel.reconstruire()
+            transaction.on_commit(cache.invalider_livres)
+
+        # relevés déjà présents sur une case (même clé) : conservés, pas dupliqués
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(centres)} centres, {len(livres)} livres, "
+            f"{ReleveCentreLivre.objects.count()} relevés en base "
+            f"sur {nb_semaines} semaines ({nb_cumuls} cumuls mensuels) "
+            f"en {time.monotonic() - debut_chrono:.1f}s"
+        ))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion.importation import TAILLE_LOT, ErreurImport, importer_releves
+
+
+class Command(BaseCommand):
+    help = "Importe des relevés depuis un ou plusieurs fichiers CSV / XLSX (upsert par centre, livre, période)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("fichiers", nargs="+", help="Fichiers .csv ou .xlsx")
+        parser.add_argument(
+            "--taille-lot",
+            type=int,
+            default=TAILLE_LOT,
+            help=f"Relevés écrits par requête (défaut : {TAILLE_LOT}).",
+        )
+
+    def handle(self, *args, **options):
+        for chemin in options["fichiers"]:
+            debut = time.monotonic()
+            try:
+                with open(chemin, "rb") as fichier:
+                    resultat = importer_releves(fichier, chemin, options["taille_lot"])
+            except (OSError, ErreurImport) as e:
+                raise CommandError(f"{chemin} : {e}")
+
+            for numero, message in resultat.erreurs:
+                self.stderr.write(f"{chemin}, ligne {numero} : {message}")
+            self.stdout.write(self.style.SUCCESS(
+                f"{chemin} : {resultat} en {time.monotonic() - debut:.1f}s"
+            ))
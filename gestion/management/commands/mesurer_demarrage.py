@@ -0,0 +1,163 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Exécuté dans un processus neuf : chargement de l'application WSGI (ce
+# que fait gunicorn au démarrage d'un worker) puis deux requêtes.
+SCRIPT_ENFANT = r"""
+import importlib, json, sys, time
+from wsgiref.util import setup_testing_defaults
+
+t0 = time.perf_counter()
+import django.core.wsgi
+t1 = time.perf_counter()
+module, _, nom = sys.argv[1].rpartition(".")
+application = getattr(importlib.import_module(module), nom)
+t2 = time.perf_counter()
+
+from django.conf import settings
+from django.db import connections
+base_au_demarrage = any(
+    c.connection is not None for c in connections.all(initialized_only=True)
+)
+hote = next((h for h in settings.ALLOWED_HOSTS if h != "*"), "localhost").lstrip(".")
+
+def requete():
+    environ = {"PATH_INFO": sys.argv[2], "HTTP_HOST": hote}
+    setup_testing_defaults(environ)
+    statut = []
+    corps = application(environ, lambda s, h, e=None: statut.append(s))
+    try:
+        for _ in corps:
+            pass
+    finally:
+        if hasattr(corps, "close"):
+            corps.close()
+    return statut[0]
+
+statut = requete()
+t3 = time.perf_counter()
+requete()
+t4 = time.perf_counter()
+
+try:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_ko = rss // 1024 if sys.platform == "darwin" else rss  # octets sous macOS
+except ImportError:  # Windows
+    rss_ko = None
+print(json.dumps({
+    "import_django": t1 - t0,
+    "application": t2 - t1,
+    "premiere_requete": t3 - t2,
+    "requete_suivante": t4 - t3,
+    "statut": statut,
+    "base_au_demarrage": base_au_demarrage,
+    "rss_ko": rss_ko,
+    "modules_lourds": [m for m in sys.argv[3].split(",") if m in sys.modules],
+}), flush=True)
+"""
+
+PHASES = ("interpreteur", "import_django", "application", "premiere_requete")
+
+# bibliothèques d'export : ne doivent pas être chargées pour une page ordinaire
+MODULES_LOURDS = ("openpyxl", "xhtml2pdf", "reportlab", "PIL", "html5lib")
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure le démarrage à froid : temps entre le lancement d'un processus "
+        "Python et la première réponse de l'application WSGI, par phase, "
+        "mémoire du processus et bibliothèques d'export chargées."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repetitions",
+            type=int,
+            default=5,
+            help="Nombre de processus lancés (défaut : 5) ; on garde la médiane.",
+        )
+        parser.add_argument(
+            "--url",
+            default="/login/",
+            help="Chemin demandé en première requête (défaut : /login/).",
+        )
+        parser.add_argument(
+            "--sortie",
+            help="Fichier JSON où écrire les mesures (optionnel).",
+        )
+
+    def _un_demarrage(self, url):
+        debut = time.perf_counter()
+        processus = subprocess.Popen(
+            [
+                sys.executable,
+                "-c",
+                SCRIPT_ENFANT,
+                settings.WSGI_APPLICATION,
+                url,
+                ",".join(MODULES_LOURDS),
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            env=os.environ.copy(),
+        )
+        ligne = processus.stdout.readline()
+        total = time.perf_counter() - debut
+        _, erreurs = processus.communicate()
+        if processus.returncode != 0 or not ligne:
+            raise CommandError(f"Le processus de mesure a échoué :\n{erreurs}")
+        mesure = json.loads(ligne)
+        mesure["total"] = total
+        # lancement de l'interpréteur et imports de base, avant django
+        mesure["interpreteur"] = total - sum(
+            mesure[phase] for phase in PHASES if phase != "interpreteur"
+        )
+        return mesure
+
+    def handle(self, *args, **options):
+        mesures = [self._un_demarrage(options["url"]) for _ in range(options["repetitions"])]
+
+        medianes = {
+            phase: statistics.median(m[phase] for m in mesures)
+            for phase in PHASES + ("total", "requete_suivante")
+        }
+        for phase in PHASES:
+            self.stdout.write(f"{phase:<20} {medianes[phase] * 1000:>9.1f} ms")
+        self.stdout.write(f"{'total':<20} {medianes['total'] * 1000:>9.1f} ms")
+        self.stdout.write(
+            f"(requête suivante : {medianes['requete_suivante'] * 1000:.1f} ms, "
+            f"statut de la première : {mesures[0]['statut']})"
+        )
+        if mesures[0]["rss_ko"] is not None:
+            rss = statistics.median(m["rss_ko"] for m in mesures)
+            self.stdout.write(f"{'mémoire (RSS max)':<20} {rss / 1024:>9.1f} Mo")
+        charges = mesures[0]["modules_lourds"]
+        self.stdout.write(
+            "modules d'export chargés : " + (", ".join(charges) if charges else "aucun")
+        )
+
+        if any(m["base_au_demarrage"] for m in mesures):
+            self.stdout.write(self.style.WARNING(
+                "Une connexion à la base est ouverte avant la première requête "
+                "(requête dans un AppConfig.ready() ou à l'import d'un module ?)."
+            ))
+
+        if options["sortie"]:
+            Path(options["sortie"]).write_text(json.dumps({
+                "url": options["url"],
+                "repetitions": options["repetitions"],
+                "medianes_ms": {k: round(v * 1000, 1) for k, v in medianes.items()},
+                "base_au_demarrage": any(m["base_au_demarrage"] for m in mesures),
+                "rss_ko": mesures[0]["rss_ko"],
+                "modules_lourds": mesures[0]["modules_lourds"],
+            }, indent=2, ensure_ascii=False))
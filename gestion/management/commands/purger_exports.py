@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from gestion import exports
+
+
+class Command(BaseCommand):
+    help = (
+        "Supprime du cache d'exports (EXPORTS_CACHE_DIR) les fichiers non servis "
+        "depuis un moment et les fichiers .verrou orphelins."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--heures",
+            type=int,
+            default=settings.EXPORTS_CACHE_CONSERVER_HEURES,
+            help="Garder les exports servis depuis moins d'heures que ça "
+                 "(défaut : EXPORTS_CACHE_CONSERVER_HEURES ; 0 : tout supprimer).",
+        )
+
+    def handle(self, *args, **options):
+        nb = exports.purger_cache(options["heures"] * 3600)
+        self.stdout.write(self.style.SUCCESS(f"{nb} export(s) supprimé(s) du cache."))
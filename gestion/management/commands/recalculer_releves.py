@@ -0,0 +1,88 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion.models import Centre, Livre, ReleveCentreLivre
+from gestion.recalcul import TAILLE_LOT, recalculer_releves
+
+
+def _date(valeur):
+    try:
+        return date.fromisoformat(valeur)
+    except ValueError:
+        raise CommandError(f"Date invalide « {valeur} » (attendu AAAA-MM-JJ).")
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule montant_ventes, quantite_reste et les frais Mobile Money "
+        "des relevés, par lots (après une correction de prix ou de barème)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--du", help="date_fin à partir de (AAAA-MM-JJ).")
+        parser.add_argument("--au", help="date_fin jusqu'au (AAAA-MM-JJ).")
+        parser.add_argument("--centre", help="Nom du centre.")
+        parser.add_argument("--livre", help="Code du livre.")
+        parser.add_argument(
+            "--taille-lot",
+            type=int,
+            default=TAILLE_LOT,
+            help=f"Relevés lus / écrits par lot (défaut : {TAILLE_LOT}).",
+        )
+        parser.add_argument(
+            "--reappliquer-bareme",
+            action="store_true",
+            help=(
+                "Repasser tous les relevés avec opérateur par le barème "
+                "(écrase aussi les taux saisis à la main)."
+            ),
+        )
+        parser.add_argument(
+            "--simulation",
+            "--dry-run",
+            dest="simulation",
+            action="store_true",
+            help="N'écrit rien : affiche les écarts relevé par relevé.",
+        )
+
+    def handle(self, *args, **options):
+        releves = ReleveCentreLivre.objects.all()
+        if options["du"]:
+            releves = releves.filter(date_fin__gte=_date(options["du"]))
+        if options["au"]:
+            releves = releves.filter(date_fin__lte=_date(options["au"]))
+        if options["centre"]:
+            try:
+                centre = Centre.objects.get(nom__iexact=options["centre"])
+            except Centre.DoesNotExist:
+                raise CommandError(f"Centre inconnu : {options['centre']}")
+            releves = releves.filter(centre=centre)
+        if options["livre"]:
+            try:
+                livre = Livre.objects.get(code__iexact=options["livre"])
+            except Livre.DoesNotExist:
+                raise CommandError(f"Livre inconnu : {options['livre']}")
+            releves = releves.filter(livre=livre)
+
+        def afficher_ecart(releve, ecarts):
+            details = ", ".join(
+                f"{champ} {ancien} → {nouveau}" for champ, (ancien, nouveau) in ecarts.items()
+            )
+            self.stdout.write(
+                f"#{releve.pk} {releve.centre_id}/{releve.livre.code} {releve.date_fin} : {details}"
+            )
+
+        debut = time.monotonic()
+        resultat = recalculer_releves(
+            releves,
+            taille_lot=options["taille_lot"],
+            simulation=options["simulation"],
+            reappliquer_bareme=options["reappliquer_bareme"],
+            sur_ecart=afficher_ecart if options["simulation"] else None,
+        )
+        suffixe = " (simulation, rien n'a été écrit)" if options["simulation"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultat} en {time.monotonic() - debut:.1f}s{suffixe}"
+        ))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from gestion.models import CumulMensuel
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les cumuls mensuels (centre / livre / mois) depuis les relevés."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--annee",
+            type=int,
+            help="Ne reconstruire que les mois de cette année.",
+        )
+
+    def handle(self, *args, **options):
+        annee = options.get("annee")
+        periodes = None
+        if annee:
+            periodes = [(annee, mois) for mois in range(1, 13)]
+
+        nb = CumulMensuel.reconstruire(periodes)
+        self.stdout.write(self.style.SUCCESS(f"{nb} cumul(s) mensuel(s) reconstruit(s)."))
@@ -0,0 +1,87 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from gestion import exports
+from gestion.models import TacheExportPdf
+
+
+class Command(BaseCommand):
+    help = "Worker : génère les PDF de rapports demandés (file TacheExportPdf)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--une-fois",
+            action="store_true",
+            help="Vider la file puis s'arrêter (au lieu de tourner en boucle).",
+        )
+        parser.add_argument(
+            "--intervalle",
+            type=float,
+            default=2.0,
+            help="Secondes d'attente quand la file est vide (défaut : 2).",
+        )
+        parser.add_argument(
+            "--conserver-heures",
+            type=int,
+            default=24,
+            help="Les tâches terminées (et exports en cache non servis) plus anciens sont supprimés (défaut : 24).",
+        )
+        parser.add_argument(
+            "--blocage-minutes",
+            type=int,
+            default=15,
+            help="Une tâche 'en cours' depuis plus longtemps est remise en attente "
+                 "(worker arrêté en plein rendu). Défaut : 15.",
+        )
+
+    def _entretien(self, options):
+        maintenant = timezone.now()
+        relancees = TacheExportPdf.objects.filter(
+            statut=TacheExportPdf.STATUT_EN_COURS,
+            demarree_le__lt=maintenant - timedelta(minutes=options["blocage_minutes"]),
+        ).update(statut=TacheExportPdf.STATUT_EN_ATTENTE, demarree_le=None)
+        if relancees:
+            self.stdout.write(f"{relancees} tâche(s) bloquée(s) remise(s) en attente.")
+
+        TacheExportPdf.objects.filter(
+            statut__in=(TacheExportPdf.STATUT_TERMINE, TacheExportPdf.STATUT_ECHEC),
+            terminee_le__lt=maintenant - timedelta(hours=options["conserver_heures"]),
+        ).delete()
+        # même durée pour les fichiers du cache d'exports non servis depuis
+        exports.purger_cache(options["conserver_heures"] * 3600)
+
+    def handle(self, *args, **options):
+        self.stdout.write("Worker exports PDF démarré.")
+        dernier_entretien = None
+        try:
+            while True:
+                close_old_connections()
+                if dernier_entretien is None or time.monotonic() - dernier_entretien > 60:
+                    self._entretien(options)
+                    dernier_entretien = time.monotonic()
+
+                tache = TacheExportPdf.prendre_suivante()
+                if tache is None:
+                    if options["une_fois"]:
+                        break
+                    time.sleep(options["intervalle"])
+                    continue
+
+                debut = time.monotonic()
+                tache.executer()
+                duree = time.monotonic() - debut
+                if tache.statut == TacheExportPdf.STATUT_TERMINE:
+                    self.stdout.write(self.style.SUCCESS(
+                        f"[{tache.pk}] {tache.nom_fichier} généré en {duree:.1f}s"
+                    ))
+                else:
+                    self.stdout.write(self.style.ERROR(
+                        f"[{tache.pk}] {tache.nom_fichier} en échec : {tache.erreur}"
+                    ))
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write("Worker exports PDF arrêté.")
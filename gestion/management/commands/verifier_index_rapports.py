@@ -0,0 +1,109 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from gestion.models import Centre, ReleveCentreLivre
+from gestion.pagination import ORDRE_RELEVES
+from gestion.rapports import (
+    ANNEE,
+    MOIS,
+    SEMAINE,
+    TRIMESTRE,
+    ReportSpec,
+    lignes_dashboard,
+    requete_agregats,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Vérifie via EXPLAIN que les requêtes des pages de rapports, du "
+        "dashboard et de la liste des relevés utilisent les index composites "
+        "(SQLite et PostgreSQL)."
+    )
+
+    def _requetes(self):
+        """
+        (nom, queryset ou fonction, index attendu), construits comme dans
+        les vues ; une fonction est exécutée et sa dernière requête expliquée.
+        """
+        jour = ReleveCentreLivre.objects.aggregate(d=Max("date_fin"))["d"] or timezone.now().date()
+        iso = jour.isocalendar()
+        trimestre = (jour.month - 1) // 3 + 1
+        centre = Centre.objects.order_by("pk").first()
+        centre_id = centre.pk if centre else 1
+
+        semaine = ReportSpec(SEMAINE, iso.year, iso.week)
+        mois = ReportSpec(MOIS, jour.year, jour.month)
+        mois_centre = ReportSpec(MOIS, jour.year, jour.month, centre_id)
+        return [
+            # rapport hebdomadaire : relevés bruts
+            ("rapport_hebdomadaire", requete_agregats(semaine.releves()), "releve_datefin_centre_idx"),
+            # mois / trimestre / année : cumuls mensuels (CumulMensuel)
+            ("rapport_mensuel", requete_agregats(mois.releves()), "cumul_periode_centre_idx"),
+            ("rapport_mensuel (centre)", requete_agregats(mois_centre.releves()), "cumul_periode_centre_idx"),
+            (
+                "rapport_trimestriel",
+                requete_agregats(ReportSpec(TRIMESTRE, jour.year, trimestre).releves()),
+                "cumul_periode_centre_idx",
+            ),
+            (
+                "rapport_annuel",
+                requete_agregats(ReportSpec(ANNEE, jour.year).releves()),
+                "cumul_periode_centre_idx",
+            ),
+            # ETag des pages de rapport : l'agrégat de ReportSpec.filigrane
+            ("filigrane_mois", mois.filigrane, "releve_datefin_centre_idx"),
+            # KPI du dashboard, lus dans les cumuls
+            ("dashboard", lignes_dashboard(jour.year, jour.month), "cumul_periode_centre_idx"),
+            ("dashboard (centre)", lignes_dashboard(jour.year, jour.month, centre_id), "cumul_periode_centre_idx"),
+            # première page de la liste des relevés d'un centre
+            (
+                "liste_releves (centre)",
+                ReleveCentreLivre.objects.du_centre(centre_id).order_by(*ORDRE_RELEVES)[:51],
+                "releve_centre_datefin_idx",
+            ),
+        ]
+
+    def _plan(self, requete):
+        if not callable(requete):
+            return requete.explain()
+        # agrégat (aggregate() n'a pas d'explain()) : on exécute la fonction
+        # et on demande le plan de la dernière requête SQL qu'elle a lancée
+        with CaptureQueriesContext(connection) as requetes:
+            requete()
+        sql = requetes.captured_queries[-1]["sql"]
+        prefixe = "EXPLAIN QUERY PLAN " if connection.vendor == "sqlite" else "EXPLAIN "
+        with connection.cursor() as cursor:
+            cursor.execute(prefixe + sql)
+            return "\n".join(" ".join(map(str, ligne)) for ligne in cursor.fetchall())
+
+    def _explain(self, requete):
+        if connection.vendor != "postgresql":
+            return self._plan(requete)
+        # Sur une petite table PostgreSQL préfère un seq scan : on l'interdit
+        # le temps de l'EXPLAIN pour vérifier que l'index est utilisable.
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+            return self._plan(requete)
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ("sqlite", "postgresql"):
+            raise CommandError(f"Base non prise en charge : {connection.vendor}")
+
+        echecs = []
+        for nom, requete, index in self._requetes():
+            plan = self._explain(requete)
+            if index in plan:
+                self.stdout.write(self.style.SUCCESS(f"OK     {nom} → {index}"))
+            else:
+                echecs.append(nom)
+                self.stdout.write(self.style.ERROR(f"ÉCHEC  {nom} (attendu : {index})"))
+            if options["verbosity"] > 1:
+                self.stdout.write(plan)
+
+        if echecs:
+            raise CommandError(f"Index non utilisé pour : {', '.join(echecs)}")
@@ -0,0 +1,95 @@
+# gestion/middleware.py
+import logging
+from contextlib import ExitStack
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+
+from . import instrumentation
+
+logger = logging.getLogger("gestion.perf")
+
+# catégories ajoutées à l'en-tête Server-Timing si elles ont été mesurées
+CATEGORIES = ("sql", "gabarit", "excel", "pdf")
+
+
+class ServerTimingMiddleware:
+    """
+    Mesure chaque requête : nombre et durée des requêtes SQL, rendu des
+    gabarits, génération Excel / PDF. Les durées partent dans l'en-tête
+    Server-Timing (visible dans l'onglet Réseau du navigateur) et dans une
+    ligne de log « gestion.perf » par requête, avec le nom de l'URL.
+    """
+
+    # en ASGI, pas d'adaptation sync/async de plus pour ce middleware-ci ;
+    # WhiteNoiseMiddleware, juste derrière, est synchrone seulement : Django
+    # passe quand même dans un thread pour lui, et en revient pour les vues
+    # async (changements de thread compris dans le « total » mesuré)
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.asynchrone = iscoroutinefunction(get_response)
+        if self.asynchrone:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.asynchrone:
+            return self.__acall__(request)
+        debut = perf_counter()
+        mesures, jeton = instrumentation.demarrer()
+        try:
+            with self._chronometrer_sql():
+                response = self.get_response(request)
+        finally:
+            instrumentation.terminer(jeton)
+        return self._terminer(request, response, mesures, perf_counter() - debut)
+
+    async def __acall__(self, request):
+        debut = perf_counter()
+        mesures, jeton = instrumentation.demarrer()
+        try:
+            with self._chronometrer_sql():
+                response = await self.get_response(request)
+        finally:
+            instrumentation.terminer(jeton)
+        return self._terminer(request, response, mesures, perf_counter() - debut)
+
+    def _chronometrer_sql(self):
+        pile = ExitStack()
+        for connexion in connections.all():
+            pile.enter_context(
+                connexion.execute_wrapper(instrumentation.chronometrer_sql)
+            )
+        return pile
+
+    def _terminer(self, request, response, mesures, total):
+        durees = {c: mesures.durees[c] for c in CATEGORIES if c in mesures.durees}
+        entrees = [f"total;dur={total * 1000:.1f}"]
+        for categorie, duree in durees.items():
+            entree = f"{categorie};dur={duree * 1000:.1f}"
+            if categorie == "sql":
+                entree += f';desc="{mesures.nb_sql} req"'
+            entrees.append(entree)
+        response["Server-Timing"] = ", ".join(entrees)
+
+        if not logger.isEnabledFor(logging.INFO):
+            return response
+
+        match = getattr(request, "resolver_match", None)
+        nom_url = (match.view_name if match else None) or "-"
+        champs = {
+            "url_name": nom_url,
+            "method": request.method,
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 1),
+            "sql_n": mesures.nb_sql,
+            **{f"{c}_ms": round(d * 1000, 1) for c, d in durees.items()},
+        }
+        logger.info(
+            " ".join(f"{cle}={valeur}" for cle, valeur in champs.items()),
+            extra={"mesures": champs},
+        )
+        return response
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+CHAMPS = (
+    "quantite_recue",
+    "quantite_vendue",
+    "quantite_reste",
+    "montant_ventes",
+    "depenses",
+    "montant_frais_retrait",
+)
+
+
+def remplir_cumuls(apps, schema_editor):
+    ReleveCentreLivre = apps.get_model("gestion", "ReleveCentreLivre")
+    CumulMensuel = apps.get_model("gestion", "CumulMensuel")
+
+    lignes = (
+        ReleveCentreLivre.objects.order_by()
+        .annotate(annee=ExtractYear("date_fin"), mois=ExtractMonth("date_fin"))
+        .values("centre_id", "livre_id", "annee", "mois")
+        .annotate(nb_releves=Count("id"), **{c: Sum(c) for c in CHAMPS})
+    )
+    CumulMensuel.objects.bulk_create(
+        [CumulMensuel(**ligne) for ligne in lignes],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0004_alter_relevecentrelivre_taux_frais_retrait'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CumulMensuel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('annee', models.PositiveSmallIntegerField()),
+                ('mois', models.PositiveSmallIntegerField()),
+                ('nb_releves', models.IntegerField(default=0)),
+                ('quantite_recue', models.IntegerField(default=0)),
+                ('quantite_vendue', models.IntegerField(default=0)),
+                ('quantite_reste', models.IntegerField(default=0)),
+                ('montant_ventes', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('depenses', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('montant_frais_retrait', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('centre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cumuls_mensuels', to='gestion.centre')),
+                ('livre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cumuls_mensuels', to='gestion.livre')),
+            ],
+            options={
+                'verbose_name': 'Cumul mensuel centre / livre',
+                'verbose_name_plural': 'Cumuls mensuels centre / livre',
+                'unique_together': {('centre', 'livre', 'annee', 'mois')},
+            },
+        ),
+        migrations.RunPython(remplir_cumuls, migrations.RunPython.noop),
+    ]
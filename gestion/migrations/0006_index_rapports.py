@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0005_cumulmensuel'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cumulmensuel',
+            index=models.Index(fields=['annee', 'mois', 'centre', 'livre'], name='cumul_periode_centre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='relevecentrelivre',
+            index=models.Index(fields=['date_fin', 'centre', 'livre'], name='releve_datefin_centre_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0006_index_rapports'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TacheExportPdf',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cle', models.CharField(db_index=True, max_length=64)),
+                ('spec', models.JSONField()),
+                ('statut', models.CharField(choices=[('EN_ATTENTE', 'En attente'), ('EN_COURS', 'En cours'), ('TERMINE', 'Terminé'), ('ECHEC', 'Échec')], default='EN_ATTENTE', max_length=12)),
+                ('nom_fichier', models.CharField(blank=True, max_length=200)),
+                ('contenu', models.BinaryField(null=True)),
+                ('erreur', models.TextField(blank=True)),
+                ('cree_le', models.DateTimeField(default=django.utils.timezone.now)),
+                ('demarree_le', models.DateTimeField(blank=True, null=True)),
+                ('terminee_le', models.DateTimeField(blank=True, null=True)),
+                ('demandee_par', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='taches_export_pdf', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': "Tâche d'export PDF",
+                'verbose_name_plural': "Tâches d'export PDF",
+                'indexes': [models.Index(fields=['statut', 'cree_le'], name='tache_pdf_statut_idx')],
+            },
+        ),
+    ]
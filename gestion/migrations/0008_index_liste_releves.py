@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0007_tacheexportpdf'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='relevecentrelivre',
+            index=models.Index(fields=['centre', 'date_fin'], name='releve_centre_datefin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='relevecentrelivre',
+            index=models.Index(fields=['livre', 'date_fin'], name='releve_livre_datefin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='relevecentrelivre',
+            index=models.Index(fields=['operateur_mobile_money', 'date_fin'], name='releve_operateur_datefin_idx'),
+        ),
+    ]
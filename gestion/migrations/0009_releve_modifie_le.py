@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:17
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def modifie_le_depuis_cree_le(apps, schema_editor):
+    # relevés existants : dernière modification inconnue, on part de la création
+    ReleveCentreLivre = apps.get_model("gestion", "ReleveCentreLivre")
+    ReleveCentreLivre.objects.update(modifie_le=F("cree_le"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0008_index_liste_releves'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='relevecentrelivre',
+            name='modifie_le',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunPython(modifie_le_depuis_cree_le, migrations.RunPython.noop),
+    ]
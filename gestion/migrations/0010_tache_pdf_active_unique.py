@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def dedoublonner_taches_actives(apps, schema_editor):
+    # doublons créés avant la contrainte : on garde la plus ancienne tâche
+    # active de chaque spec, les autres passent en échec
+    TacheExportPdf = apps.get_model("gestion", "TacheExportPdf")
+    vues = set()
+    for tache in TacheExportPdf.objects.filter(
+        statut__in=("EN_ATTENTE", "EN_COURS")
+    ).order_by("cree_le", "pk"):
+        if tache.cle in vues:
+            TacheExportPdf.objects.filter(pk=tache.pk).update(
+                statut="ECHEC", erreur="Doublon d'une demande identique."
+            )
+        vues.add(tache.cle)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0009_releve_modifie_le'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(dedoublonner_taches_actives, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='tacheexportpdf',
+            constraint=models.UniqueConstraint(condition=models.Q(('statut__in', ('EN_ATTENTE', 'EN_COURS'))), fields=('cle',), name='tache_pdf_active_unique'),
+        ),
+    ]
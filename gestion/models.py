@@ -1,7 +1,49 @@
-from django.db import models
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Q, Sum, Count
+from django.db.models.functions import ExtractMonth, ExtractYear
 from django.utils import timezone
 from decimal import Decimal
+from datetime import date, timedelta
+import hashlib
+import json
 
+from . import frais
+
+
+def centre_perimetre(user):
+    """id du centre auquel l'utilisateur est limité, None pour un admin."""
+    if hasattr(user, "is_centre") and user.is_centre() and user.centre_id:
+        return user.centre_id
+    return None
+
+
+class PerimetreQuerySet(models.QuerySet):
+    """
+    Restriction au périmètre d'un utilisateur, écrite une seule fois.
+
+    Filtre sur l'id du centre (user.centre_id) : aucune requête pour charger
+    le Centre lui-même, contrairement à filter(centre=user.centre).
+    """
+
+    champ_centre = "centre_id"
+
+    def du_centre(self, centre_id):
+        """Lignes du centre donné ; centre_id=None = tous les centres (admin)."""
+        if centre_id:
+            return self.filter(**{self.champ_centre: centre_id})
+        return self
+
+    def for_user(self, user):
+        """Lignes visibles par l'utilisateur (son centre, ou tout pour un admin)."""
+        return self.du_centre(centre_perimetre(user))
+
+
+class CentreQuerySet(PerimetreQuerySet):
+    champ_centre = "pk"
+
+    def visible_to(self, user):
+        return self.for_user(user)
 
 
 class Centre(models.Model):
@@ -9,6 +51,8 @@ class Centre(models.Model):
     ville = models.CharField(max_length=100, blank=True)
     contact = models.CharField(max_length=100, blank=True)
 
+    objects = CentreQuerySet.as_manager()
+
     def __str__(self):
         return self.nom
 
@@ -120,6 +164,11 @@ class ReleveCentreLivre(models.Model):
 
     # Pour traçabilité
     cree_le = models.DateTimeField(default=timezone.now)
+    # mis à jour par save() ; les écritures en lot (import, recalcul) le
+    # renseignent elles-mêmes. Sert de filigrane aux pages de rapport (ETag).
+    modifie_le = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = PerimetreQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Relevé centre / livre"
@@ -130,6 +179,26 @@ class ReleveCentreLivre(models.Model):
             "date_debut",
             "date_fin",
         )
+        indexes = [
+            # filtres date_fin__gte / date_fin__lte des rapports et du dashboard
+            models.Index(
+                fields=["date_fin", "centre", "livre"],
+                name="releve_datefin_centre_idx",
+            ),
+            # filtres de la liste des relevés, triée par date_fin
+            models.Index(
+                fields=["centre", "date_fin"],
+                name="releve_centre_datefin_idx",
+            ),
+            models.Index(
+                fields=["livre", "date_fin"],
+                name="releve_livre_datefin_idx",
+            ),
+            models.Index(
+                fields=["operateur_mobile_money", "date_fin"],
+                name="releve_operateur_datefin_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.centre} - {self.livre} ({self.date_debut} → {self.date_fin})"
@@ -150,80 +219,349 @@ class ReleveCentreLivre(models.Model):
 
     def _compute_mobile_money_fees(self):
         """
-        Calcule automatiquement les frais de retrait selon l'opérateur.
-        Règles (simplifiées) basées sur ce que tu as donné :
-          - ORANGE : 1% du montant retiré
-          - MOOV   : 1% du montant retiré
-          - WAVE   : 0% (retrait gratuit)
-          - MTN    :
-              * < 100 000 FCFA  -> 0 frais
-              * 100 000 à 500 000 -> 1%
-              * > 500 000 -> 5 000 FCFA (on enregistre aussi un taux effectif)
+        Calcule automatiquement les frais de retrait selon l'opérateur,
+        d'après le barème en vigueur à date_fin (voir gestion/frais.py).
         Retourne (frais, taux_en_pourcentage_ou_None)
         """
-        montant = self.montant_ventes or Decimal("0")
-        if not self.operateur_mobile_money or montant <= 0:
-            return Decimal("0"), None
-
-        op = self.operateur_mobile_money
-
-        # Orange & Moov : 1%
-        if op in (self.OPERATEUR_ORANGE, self.OPERATEUR_MOOV):
-            taux = Decimal("1.00")
-            frais = (montant * taux / Decimal("100")).quantize(Decimal("0.01"))
-            return frais, taux
-
-        # Wave : 0%
-        if op == self.OPERATEUR_WAVE:
-            taux = Decimal("0.00")
-            frais = Decimal("0.00")
-            return frais, taux
-
-        # MTN : règles spéciales
-        if op == self.OPERATEUR_MTN:
-            if montant < Decimal("100000"):
-                # Pas de frais sous 100 000
-                return Decimal("0.00"), Decimal("0.00")
-            elif montant <= Decimal("500000"):
-                # 1% entre 100 000 et 500 000
-                taux = Decimal("1.00")
-                frais = (montant * taux / Decimal("100")).quantize(Decimal("0.01"))
-                return frais, taux
+        return frais.grille().calculer(
+            self.operateur_mobile_money, self.montant_ventes, self.date_fin
+        )
+
+    def calculer_montants(self):
+        """
+        Prix par défaut, montant, reste et frais Mobile Money, sans écrire
+        en base (appelé par save()).
+        """
+        ReleveCentreLivre.calculer_montants_lot([self])
+
+    @classmethod
+    def calculer_montants_lot(cls, releves):
+        """
+        calculer_montants() pour tout un lot (import, recalcul) : les frais
+        automatiques sont calculés en une passe par le barème compilé.
+        Les livres doivent être déjà chargés (select_related) pour éviter
+        une requête par relevé sans prix.
+        """
+        a_calculer = []
+        for releve in releves:
+            # Si aucun prix renseigné, on reprend celui du livre
+            if not releve.prix_unitaire and releve.livre_id:
+                releve.prix_unitaire = releve.livre.prix_unitaire_defaut
+
+            # Calcul automatique montant & reste
+            releve.montant_ventes = releve.quantite_vendue * releve.prix_unitaire
+            releve.quantite_reste = releve.quantite_recue - releve.quantite_vendue
+
+            # Frais de retrait Mobile Money
+            if not releve.taux_frais_retrait and releve.operateur_mobile_money:
+                # Aucun taux saisi → règles du barème (calculées en lot plus bas)
+                a_calculer.append(releve)
+            elif releve.taux_frais_retrait:
+                # Taux saisi manuellement → on respecte ce choix
+                releve.montant_frais_retrait = (
+                    releve.montant_ventes * releve.taux_frais_retrait / Decimal("100")
+                )
             else:
-                # > 500 000 : 5 000 FCFA fixe, on calcule aussi un taux effectif
-                frais = Decimal("5000.00")
-                if montant > 0:
-                    taux = (frais * Decimal("100") / montant).quantize(Decimal("0.01"))
-                else:
-                    taux = None
-                return frais, taux
+                # Pas d'opérateur ni de taux → pas de frais
+                releve.montant_frais_retrait = Decimal("0.00")
 
-        # Par défaut si jamais un autre opérateur arrive
-        return Decimal("0"), None
+        resultats = frais.grille().calculer_lot(
+            (r.operateur_mobile_money, r.montant_ventes, r.date_fin) for r in a_calculer
+        )
+        for releve, (montant_frais, taux) in zip(a_calculer, resultats):
+            releve.montant_frais_retrait = montant_frais
+            if taux is not None:
+                releve.taux_frais_retrait = taux
 
     def save(self, *args, **kwargs):
-        # Si aucun prix renseigné, on reprend celui du livre
-        if not self.prix_unitaire and self.livre_id:
-            self.prix_unitaire = self.livre.prix_unitaire_defaut
-
-        # Calcul automatique montant & reste
-        self.montant_ventes = self.quantite_vendue * self.prix_unitaire
-        self.quantite_reste = self.quantite_recue - self.quantite_vendue
-
-        # Frais de retrait Mobile Money
-        if not self.taux_frais_retrait and self.operateur_mobile_money:
-            # Aucun taux saisi → on applique automatiquement les règles
-            frais, taux = self._compute_mobile_money_fees()
-            self.montant_frais_retrait = frais
-            if taux is not None:
-                self.taux_frais_retrait = taux
-        elif self.taux_frais_retrait:
-            # Taux saisi manuellement → on respecte ce choix
-            self.montant_frais_retrait = (
-                self.montant_ventes * self.taux_frais_retrait / Decimal("100")
+        self.calculer_montants()
+
+        # Le relevé et son cumul mensuel sont écrits dans la même transaction
+        with transaction.atomic():
+            ancien = None
+            if self.pk:
+                ancien = (
+                    ReleveCentreLivre.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .first()
+                )
+            super().save(*args, **kwargs)
+            if ancien is not None:
+                CumulMensuel.retirer(ancien)
+            CumulMensuel.ajouter(self)
+
+        # Lu par gestion/signals.py pour invalider aussi l'ancienne période
+        self._ancien_releve = ancien
+
+
+class CumulMensuel(models.Model):
+    """
+    Cumul des relevés par centre / livre / mois (mois de date_fin).
+    Tenu à jour par ReleveCentreLivre.save() et à la suppression d'un relevé
+    (voir gestion/signals.py). Les rapports mois / trimestre / année / global
+    lisent cette table au lieu de re-parcourir tous les relevés.
+    """
+
+    centre = models.ForeignKey(
+        Centre,
+        on_delete=models.CASCADE,
+        related_name="cumuls_mensuels"
+    )
+    livre = models.ForeignKey(
+        Livre,
+        on_delete=models.CASCADE,
+        related_name="cumuls_mensuels"
+    )
+    annee = models.PositiveSmallIntegerField()
+    mois = models.PositiveSmallIntegerField()
+
+    nb_releves = models.IntegerField(default=0)
+    quantite_recue = models.IntegerField(default=0)
+    quantite_vendue = models.IntegerField(default=0)
+    quantite_reste = models.IntegerField(default=0)
+    montant_ventes = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    depenses = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    montant_frais_retrait = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0
+    )
+
+    # champs cumulés (même nom que sur ReleveCentreLivre)
+    CHAMPS = (
+        "quantite_recue",
+        "quantite_vendue",
+        "quantite_reste",
+        "montant_ventes",
+        "depenses",
+        "montant_frais_retrait",
+    )
+
+    objects = PerimetreQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Cumul mensuel centre / livre"
+        verbose_name_plural = "Cumuls mensuels centre / livre"
+        unique_together = (
+            "centre",
+            "livre",
+            "annee",
+            "mois",
+        )
+        indexes = [
+            models.Index(
+                fields=["annee", "mois", "centre", "livre"],
+                name="cumul_periode_centre_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.centre_id} - {self.livre_id} ({self.mois:02d}/{self.annee})"
+
+    @classmethod
+    def _deltas(cls, releve, signe):
+        deltas = {
+            champ: F(champ) + signe * (getattr(releve, champ) or 0)
+            for champ in cls.CHAMPS
+        }
+        deltas["nb_releves"] = F("nb_releves") + signe
+        return deltas
+
+    @classmethod
+    def _cle(cls, releve):
+        return {
+            "centre_id": releve.centre_id,
+            "livre_id": releve.livre_id,
+            "annee": releve.date_fin.year,
+            "mois": releve.date_fin.month,
+        }
+
+    @classmethod
+    def ajouter(cls, releve):
+        """Ajoute un relevé au cumul de son mois (crée la ligne si besoin)."""
+        cumul, _ = cls.objects.get_or_create(**cls._cle(releve))
+        cls.objects.filter(pk=cumul.pk).update(**cls._deltas(releve, 1))
+
+    @classmethod
+    def retirer(cls, releve):
+        """
+        Retire un relevé de son cumul. Ne crée jamais de ligne : lors d'une
+        suppression en cascade (centre / livre) le cumul peut déjà avoir disparu.
+        """
+        cumuls = cls.objects.filter(**cls._cle(releve))
+        cumuls.update(**cls._deltas(releve, -1))
+        cumuls.filter(nb_releves__lte=0).delete()
+
+    @classmethod
+    def reconstruire(cls, periodes=None):
+        """
+        Recalcule les cumuls depuis les relevés, en une requête groupée.
+        periodes : liste de (annee, mois) à reconstruire, ou None pour tout.
+        """
+        releves = ReleveCentreLivre.objects.all()
+        cumuls = cls.objects.all()
+        if periodes is not None:
+            periodes = set(periodes)
+            if not periodes:
+                return 0
+            filtre_releves = Q()
+            filtre_cumuls = Q()
+            for annee, mois in periodes:
+                debut = date(annee, mois, 1)
+                fin = (debut + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+                filtre_releves |= Q(date_fin__gte=debut, date_fin__lte=fin)
+                filtre_cumuls |= Q(annee=annee, mois=mois)
+            releves = releves.filter(filtre_releves)
+            cumuls = cumuls.filter(filtre_cumuls)
+
+        lignes = (
+            releves.order_by()
+            .annotate(annee=ExtractYear("date_fin"), mois=ExtractMonth("date_fin"))
+            .values("centre_id", "livre_id", "annee", "mois")
+            .annotate(
+                nb_releves=Count("id"),
+                **{champ: Sum(champ) for champ in cls.CHAMPS},
+            )
+        )
+        with transaction.atomic():
+            cumuls.delete()
+            nouveaux = cls.objects.bulk_create(
+                [cls(**ligne) for ligne in lignes],
+                batch_size=500,
+            )
+        return len(nouveaux)
+
+
+class TacheExportPdf(models.Model):
+    """
+    Génération d'un PDF de rapport en file d'attente (table en base).
+    La vue d'export crée la tâche, la commande traiter_exports_pdf la rend
+    avec xhtml2pdf, l'utilisateur télécharge le fichier une fois prêt.
+    """
+
+    STATUT_EN_ATTENTE = "EN_ATTENTE"
+    STATUT_EN_COURS = "EN_COURS"
+    STATUT_TERMINE = "TERMINE"
+    STATUT_ECHEC = "ECHEC"
+
+    STATUT_CHOICES = (
+        (STATUT_EN_ATTENTE, "En attente"),
+        (STATUT_EN_COURS, "En cours"),
+        (STATUT_TERMINE, "Terminé"),
+        (STATUT_ECHEC, "Échec"),
+    )
+
+    # empreinte de la spec du rapport : deux demandes identiques partagent la tâche
+    cle = models.CharField(max_length=64, db_index=True)
+    spec = models.JSONField()
+    statut = models.CharField(
+        max_length=12,
+        choices=STATUT_CHOICES,
+        default=STATUT_EN_ATTENTE,
+    )
+    nom_fichier = models.CharField(max_length=200, blank=True)
+    contenu = models.BinaryField(null=True, editable=False)
+    erreur = models.TextField(blank=True)
+
+    demandee_par = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="taches_export_pdf",
+    )
+    cree_le = models.DateTimeField(default=timezone.now)
+    demarree_le = models.DateTimeField(null=True, blank=True)
+    terminee_le = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Tâche d'export PDF"
+        verbose_name_plural = "Tâches d'export PDF"
+        indexes = [
+            models.Index(fields=["statut", "cree_le"], name="tache_pdf_statut_idx"),
+        ]
+        constraints = [
+            # une seule tâche active par spec, même avec deux clics simultanés
+            # (voir demander())
+            models.UniqueConstraint(
+                fields=["cle"],
+                condition=Q(statut__in=("EN_ATTENTE", "EN_COURS")),
+                name="tache_pdf_active_unique",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.nom_fichier or self.cle[:12]} ({self.get_statut_display()})"
+
+    @staticmethod
+    def empreinte(spec):
+        return hashlib.sha256(
+            json.dumps(spec.to_dict(), sort_keys=True).encode()
+        ).hexdigest()
+
+    @property
+    def est_terminee(self):
+        return self.statut in (self.STATUT_TERMINE, self.STATUT_ECHEC)
+
+    def report_spec(self):
+        from .rapports import ReportSpec
+        return ReportSpec.from_dict(self.spec)
+
+    @classmethod
+    def demander(cls, spec, user=None):
+        """Retourne la tâche en attente / en cours pour cette spec, ou en crée une."""
+        from .exports import nom_fichier_pdf
+
+        cle = cls.empreinte(spec)
+        while True:
+            tache = cls.objects.filter(
+                cle=cle,
+                statut__in=(cls.STATUT_EN_ATTENTE, cls.STATUT_EN_COURS),
+            ).first()
+            if tache is not None:
+                return tache
+            try:
+                with transaction.atomic():
+                    return cls.objects.create(
+                        cle=cle,
+                        spec=spec.to_dict(),
+                        nom_fichier=nom_fichier_pdf(spec),
+                        demandee_par=user if user and user.is_authenticated else None,
+                    )
+            except IntegrityError:
+                # la même demande vient d'être créée en parallèle
+                # (tache_pdf_active_unique) : on reprend la sienne
+                continue
+
+    @classmethod
+    def prendre_suivante(cls):
+        """
+        Réserve la plus ancienne tâche en attente. La réservation est un UPDATE
+        conditionnel : deux workers ne peuvent pas prendre la même tâche.
+        """
+        candidates = (
+            cls.objects.filter(statut=cls.STATUT_EN_ATTENTE)
+            .order_by("cree_le")
+            .values_list("pk", flat=True)[:10]
+        )
+        for pk in candidates:
+            prise = cls.objects.filter(pk=pk, statut=cls.STATUT_EN_ATTENTE).update(
+                statut=cls.STATUT_EN_COURS,
+                demarree_le=timezone.now(),
             )
-        else:
-            # Pas d'opérateur ni de taux → pas de frais
-            self.montant_frais_retrait = Decimal("0.00")
+            if prise:
+                return cls.objects.get(pk=pk)
+        return None
+
+    def executer(self):
+        from .exports import rendre_pdf
+
+        try:
+            self.contenu = rendre_pdf(self.report_spec())
+            self.statut = self.STATUT_TERMINE
+            self.erreur = ""
+        except Exception as e:
+            self.contenu = None
+            self.statut = self.STATUT_ECHEC
+            self.erreur = str(e)
+        self.terminee_le = timezone.now()
+        self.save(update_fields=["contenu", "statut", "erreur", "terminee_le"])
 
-        super().save(*args, **kwargs)
@@ -0,0 +1,82 @@
+# gestion/pagination.py
+"""
+Pagination par clé (keyset / seek) de la liste des relevés.
+
+Au lieu d'un OFFSET qui relit toutes les lignes précédentes, chaque page
+repart de la dernière ligne affichée : (date_fin, nom du centre, id).
+Le coût d'une page reste le même quelle que soit la taille de l'historique.
+"""
+import base64
+import binascii
+import json
+from datetime import date
+
+from django.db import connection
+from django.db.models import Q
+
+# ordre de la liste : date_fin décroissante, puis centre, puis id (départage)
+ORDRE_RELEVES = ("-date_fin", "centre__nom", "id")
+
+
+def encoder_curseur(releve):
+    """Curseur opaque (pour l'URL) pointant après ce relevé."""
+    brut = json.dumps(
+        [releve.date_fin.isoformat(), releve.centre.nom, releve.pk],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(brut.encode()).decode().rstrip("=")
+
+
+def decoder_curseur(curseur):
+    """(date_fin, nom_centre, id) ou None si le curseur est absent / invalide."""
+    if not curseur:
+        return None
+    try:
+        brut = base64.urlsafe_b64decode(curseur + "=" * (-len(curseur) % 4))
+        date_fin, nom_centre, pk = json.loads(brut)
+        return date.fromisoformat(date_fin), str(nom_centre), int(pk)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+
+
+def apres_curseur(qs, curseur):
+    """Relevés situés strictement après le curseur dans ORDRE_RELEVES."""
+    cle = decoder_curseur(curseur)
+    if cle is None:
+        return qs
+    date_fin, nom_centre, pk = cle
+    # borne date_fin <= … hors du OR : c'est elle que la base utilise comme
+    # intervalle sur l'index (SEARCH et non SCAN), la page suivante coûte
+    # alors la même chose quelle que soit sa profondeur
+    return qs.filter(date_fin__lte=date_fin).filter(
+        Q(date_fin__lt=date_fin)
+        | Q(date_fin=date_fin, centre__nom__gt=nom_centre)
+        | Q(date_fin=date_fin, centre__nom=nom_centre, id__gt=pk)
+    )
+
+
+def page_releves(qs, curseur=None, taille=50):
+    """
+    Retourne (releves, curseur_suivant) ; curseur_suivant vaut None sur la
+    dernière page. On lit taille + 1 lignes pour savoir s'il reste une page.
+    """
+    lignes = list(apres_curseur(qs.order_by(*ORDRE_RELEVES), curseur)[: taille + 1])
+    if len(lignes) > taille:
+        lignes = lignes[:taille]
+        return lignes, encoder_curseur(lignes[-1])
+    return lignes, None
+
+
+def estimer_total(qs):
+    """
+    Nombre de lignes du queryset. Sur PostgreSQL on lit l'estimation du
+    planificateur (EXPLAIN) au lieu d'un COUNT(*) qui parcourt toutes les
+    lignes ; ailleurs (SQLite) on compte.
+    Retourne (nombre, est_estime).
+    """
+    if connection.vendor != "postgresql":
+        return qs.count(), False
+    plan = json.loads(qs.order_by().explain(format="json"))
+    if isinstance(plan, list):  # selon le pilote, liste d'un seul plan
+        plan = plan[0]
+    return int(plan["Plan"]["Plan Rows"]), True
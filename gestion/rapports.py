@@ -0,0 +1,473 @@
+# gestion/rapports.py
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Optional
+
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncMonth, TruncQuarter, TruncWeek
+from django.utils import timezone
+
+from . import cache
+from .asynchrone import en_parallele
+from .models import Centre, CumulMensuel, Livre, ReleveCentreLivre, centre_perimetre
+
+
+# clé dans la cellule du tableau -> champ sommé sur ReleveCentreLivre
+CHAMPS_AGREGES = {
+    "q_recue": "quantite_recue",
+    "q_vendue": "quantite_vendue",
+    "reste": "quantite_reste",
+    "montant": "montant_ventes",
+    "dep": "depenses",
+}
+
+SEMAINE = "semaine"
+MOIS = "mois"
+TRIMESTRE = "trimestre"
+ANNEE = "annee"
+GLOBAL = "global"
+
+MONTH_CHOICES = [
+    (1, "Janvier"),
+    (2, "Février"),
+    (3, "Mars"),
+    (4, "Avril"),
+    (5, "Mai"),
+    (6, "Juin"),
+    (7, "Juillet"),
+    (8, "Août"),
+    (9, "Septembre"),
+    (10, "Octobre"),
+    (11, "Novembre"),
+    (12, "Décembre"),
+]
+
+QUARTER_CHOICES = [
+    (1, "1er trimestre (Jan–Mar)"),
+    (2, "2e trimestre (Avr–Jun)"),
+    (3, "3e trimestre (Jul–Sep)"),
+    (4, "4e trimestre (Oct–Déc)"),
+]
+
+
+def _week_range(year: int, week: int):
+    """Retourne (date_debut, date_fin) pour une semaine ISO (lundi → dimanche)."""
+    # fromisocalendar(year, week, weekday) : weekday = 1 (lundi)
+    start = date.fromisocalendar(year, week, 1)
+    end = start + timedelta(days=6)
+    return start, end
+
+
+def _month_range(year: int, month: int):
+    """Retourne (date_debut, date_fin) pour un mois donné."""
+    start = date(year, month, 1)
+    if month == 12:
+        end = date(year + 1, 1, 1) - timedelta(days=1)
+    else:
+        end = date(year, month + 1, 1) - timedelta(days=1)
+    return start, end
+
+
+def _quarter_range(year: int, quarter: int):
+    """Retourne (date_debut, date_fin) pour un trimestre donné (1 à 4)."""
+    if quarter < 1:
+        quarter = 1
+    if quarter > 4:
+        quarter = 4
+    start_month = (quarter - 1) * 3 + 1  # 1, 4, 7, 10
+    end_month = start_month + 2          # 3, 6, 9, 12
+    start, _ = _month_range(year, start_month)
+    _, end = _month_range(year, end_month)
+    return start, end
+
+
+def _int_param(request, nom, defaut):
+    try:
+        return int(request.GET.get(nom, defaut))
+    except ValueError:
+        return defaut
+
+
+def requete_agregats(releves):
+    """Requête groupée (centre, livre) des sommes de CHAMPS_AGREGES."""
+    return (
+        releves.order_by()
+        .values("centre_id", "livre_id")
+        .annotate(**{cle: Sum(champ) for cle, champ in CHAMPS_AGREGES.items()})
+    )
+
+
+def agreger_par_centre_livre(releves):
+    """
+    Agrège les relevés en UNE seule requête groupée (centre, livre).
+    Retourne un dict {(centre_id, livre_id): {"q_recue": ..., ...}}.
+    """
+    return {(l["centre_id"], l["livre_id"]): l for l in requete_agregats(releves)}
+
+
+def cellule(agregats, centre_id, livre_id):
+    """Sommes d'un couple centre / livre (0 si aucun relevé)."""
+    agg = agregats.get((centre_id, livre_id), {})
+    return {cle: agg.get(cle) or 0 for cle in CHAMPS_AGREGES}
+
+
+def construire_lignes(centres, livres, agregats):
+    """
+    Remplit en mémoire la matrice centre × livre attendue par
+    gestion/rapport_table.html et les gabarits PDF.
+    """
+    rows = []
+    for centre in centres:
+        row = {"centre": centre, "livres": []}
+        for livre in livres:
+            data = {"livre": livre}
+            data.update(cellule(agregats, centre.pk, livre.pk))
+            row["livres"].append(data)
+        rows.append(row)
+    return rows
+
+
+def pivot_releves(releves, centres, livres):
+    """Matrice centre × livre d'un queryset de relevés, en une requête."""
+    return construire_lignes(centres, livres, agreger_par_centre_livre(releves))
+
+
+def _premier_livre(livres, nom, fragment_code):
+    """Même choix que filter(nom__iexact=...).first() or filter(code__icontains=...).first()."""
+    for critere in (
+        lambda l: l.nom.lower() == nom.lower(),
+        lambda l: fragment_code.lower() in l.code.lower(),
+    ):
+        candidats = [l for l in livres if critere(l)]
+        if candidats:
+            return min(candidats, key=lambda l: l.pk)
+    return None
+
+
+class RapportResultat:
+    """
+    Résultat calculé d'un rapport, consommé tel quel par les rendus
+    HTML, PDF et Excel (et mis en cache tel quel).
+    """
+
+    def __init__(self, livres, rows):
+        self.livres = livres
+        self.rows = rows
+
+    @property
+    def colspan(self):
+        return 1 + len(self.livres) * 4
+
+    @property
+    def viatique(self):
+        return _premier_livre(self.livres, "Viatique", "VIAT")
+
+    @property
+    def activite(self):
+        return _premier_livre(self.livres, "Activités", "ACT")
+
+    def cellule(self, row, livre):
+        """Cellule d'une ligne pour un livre (zéros si livre absent)."""
+        if livre is not None:
+            for data in row["livres"]:
+                if data["livre"].pk == livre.pk:
+                    return data
+        return {cle: 0 for cle in CHAMPS_AGREGES}
+
+    def totaux(self, livre):
+        """Totaux d'un livre sur tous les centres du rapport."""
+        totaux = {cle: 0 for cle in CHAMPS_AGREGES}
+        for row in self.rows:
+            data = self.cellule(row, livre)
+            for cle in totaux:
+                totaux[cle] += data[cle]
+        return totaux
+
+
+@dataclass(frozen=True)
+class ReportSpec:
+    """
+    Rapport demandé : type de période + bornes + périmètre utilisateur.
+    Une même spec donne le même RapportResultat, quel que soit le format.
+    """
+
+    type_periode: str
+    annee: Optional[int] = None
+    numero: Optional[int] = None  # n° de semaine, de mois ou de trimestre
+    centre_id: Optional[int] = None  # None = périmètre admin (tous les centres)
+
+    @classmethod
+    def depuis_requete(cls, request, type_periode):
+        today = timezone.now().date()
+        centre_id = centre_perimetre(request.user)
+
+        if type_periode == SEMAINE:
+            iso = today.isocalendar()  # namedtuple (year, week, weekday)
+            annee = _int_param(request, "year", iso.year)
+            numero = _int_param(request, "week", iso.week)
+        elif type_periode == MOIS:
+            annee = _int_param(request, "year", today.year)
+            numero = _int_param(request, "month", today.month)
+        elif type_periode == TRIMESTRE:
+            annee = _int_param(request, "year", today.year)
+            numero = min(max(_int_param(request, "quarter", 1), 1), 4)
+        elif type_periode == ANNEE:
+            annee = _int_param(request, "year", today.year)
+            numero = None
+        else:
+            annee = numero = None
+        return cls(type_periode, annee, numero, centre_id)
+
+    def to_dict(self):
+        return {
+            "type_periode": self.type_periode,
+            "annee": self.annee,
+            "numero": self.numero,
+            "centre_id": self.centre_id,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    @property
+    def bornes(self):
+        """(date_debut, date_fin) de la période, (None, None) pour le global."""
+        if self.type_periode == SEMAINE:
+            return _week_range(self.annee, self.numero)
+        if self.type_periode == MOIS:
+            return _month_range(self.annee, self.numero)
+        if self.type_periode == TRIMESTRE:
+            return _quarter_range(self.annee, self.numero)
+        if self.type_periode == ANNEE:
+            return date(self.annee, 1, 1), date(self.annee, 12, 31)
+        return None, None
+
+    @property
+    def periode(self):
+        """Identifiant de période utilisé par gestion/cache.py."""
+        if self.type_periode == SEMAINE:
+            return cache.periode_semaine(self.annee, self.numero)
+        if self.type_periode == MOIS:
+            return cache.periode_mois(self.annee, self.numero)
+        if self.type_periode == TRIMESTRE:
+            return cache.periode_trimestre(self.annee, self.numero)
+        if self.type_periode == ANNEE:
+            return cache.periode_annee(self.annee)
+        return cache.PERIODE_GLOBALE
+
+    @property
+    def perimetre(self):
+        return f"centre-{self.centre_id}" if self.centre_id else "admin"
+
+    def releves(self):
+        """
+        Lignes à agréger : relevés bruts pour la semaine (elle ne tombe pas
+        sur des mois entiers), cumuls mensuels pour les autres périodes.
+        """
+        if self.type_periode == SEMAINE:
+            date_debut, date_fin = self.bornes
+            qs = ReleveCentreLivre.objects.filter(
+                date_fin__gte=date_debut,
+                date_fin__lte=date_fin,
+            )
+        elif self.type_periode == MOIS:
+            qs = CumulMensuel.objects.filter(annee=self.annee, mois=self.numero)
+        elif self.type_periode == TRIMESTRE:
+            date_debut, date_fin = self.bornes
+            qs = CumulMensuel.objects.filter(
+                annee=self.annee,
+                mois__gte=date_debut.month,
+                mois__lte=date_fin.month,
+            )
+        elif self.type_periode == ANNEE:
+            qs = CumulMensuel.objects.filter(annee=self.annee)
+        else:
+            qs = CumulMensuel.objects.all()
+
+        return qs.du_centre(self.centre_id)
+
+    def filigrane(self):
+        """
+        (dernière modification, nombre) des relevés de la période et du
+        périmètre, en une requête : change à chaque création / modification
+        (date) et suppression (nombre) d'un relevé qui entre dans le rapport.
+        """
+        res = self.releves_bruts().aggregate(dernier=Max("modifie_le"), nombre=Count("id"))
+        return res["dernier"], res["nombre"]
+
+    def releves_bruts(self):
+        """Relevés (et non cumuls) de la période et du périmètre."""
+        qs = ReleveCentreLivre.objects.all()
+        date_debut, date_fin = self.bornes
+        if date_debut is not None:
+            qs = qs.filter(date_fin__gte=date_debut, date_fin__lte=date_fin)
+        return qs.du_centre(self.centre_id)
+
+    def centres(self):
+        return Centre.objects.du_centre(self.centre_id).order_by("nom")
+
+    def calculer(self):
+        livres = list(Livre.objects.all().order_by("nom"))
+        rows = pivot_releves(self.releves(), self.centres(), livres)
+        return RapportResultat(livres, rows)
+
+    def resoudre(self):
+        """RapportResultat de la spec, depuis le cache si possible."""
+        return cache.resultat_en_cache("resultat", self.periode, self.perimetre, self.calculer)
+
+    async def acalculer(self):
+        """
+        calculer() pour les vues async : livres, centres et agrégats sont
+        trois requêtes indépendantes, lancées en même temps.
+        """
+        livres, centres, agregats = await en_parallele(
+            lambda: list(Livre.objects.all().order_by("nom")),
+            lambda: list(self.centres()),
+            lambda: agreger_par_centre_livre(self.releves()),
+        )
+        return RapportResultat(livres, construire_lignes(centres, livres, agregats))
+
+    async def aresoudre(self):
+        """resoudre() pour les vues async."""
+        return await cache.aresultat_en_cache(
+            "resultat", self.periode, self.perimetre, self.acalculer
+        )
+
+
+def feuilles_annee(spec):
+    """
+    Rapports de chaque mois, de chaque trimestre et de l'année de spec,
+    calculés à partir d'UNE requête sur les cumuls mensuels de l'année,
+    répartie ensuite en mémoire. Retourne [(titre de feuille, RapportResultat)].
+    """
+    livres = list(Livre.objects.all().order_by("nom"))
+    centres = list(spec.centres())
+
+    cumuls = CumulMensuel.objects.filter(annee=spec.annee).du_centre(spec.centre_id)
+    lignes = cumuls.values_list(
+        "mois", "centre_id", "livre_id", *CHAMPS_AGREGES.values()
+    )
+
+    # agrégats {(centre_id, livre_id): {"q_recue": ..., ...}} par mois
+    par_mois = {mois: {} for mois in range(1, 13)}
+    for mois, centre_id, livre_id, *valeurs in lignes:
+        par_mois[mois][(centre_id, livre_id)] = dict(zip(CHAMPS_AGREGES, valeurs))
+
+    def cumuler(liste_mois):
+        agregats = {}
+        for mois in liste_mois:
+            for cle, valeurs in par_mois[mois].items():
+                somme = agregats.setdefault(cle, {c: 0 for c in CHAMPS_AGREGES})
+                for champ, valeur in valeurs.items():
+                    somme[champ] += valeur
+        return agregats
+
+    def resultat(agregats):
+        return RapportResultat(livres, construire_lignes(centres, livres, agregats))
+
+    feuilles = [(nom, resultat(par_mois[mois])) for mois, nom in MONTH_CHOICES]
+    for trimestre in range(1, 5):
+        premier = (trimestre - 1) * 3 + 1
+        feuilles.append(
+            (f"T{trimestre}", resultat(cumuler(range(premier, premier + 3))))
+        )
+    feuilles.append((f"Année {spec.annee}", resultat(cumuler(range(1, 13)))))
+    return feuilles
+
+
+def contexte_rapport(spec, resultat):
+    """Contexte commun aux pages HTML et aux PDF d'un rapport."""
+    context = {
+        "livres": resultat.livres,
+        "rows": resultat.rows,
+        "colspan": resultat.colspan,
+    }
+    if spec.annee is not None:
+        context["year"] = spec.annee
+    if spec.type_periode == SEMAINE:
+        date_debut, date_fin = spec.bornes
+        context["week"] = spec.numero
+        context["week_label"] = f"Semaine {spec.numero} ({date_debut} → {date_fin})"
+    elif spec.type_periode == MOIS:
+        context["month"] = spec.numero
+        context["month_name"] = dict(MONTH_CHOICES).get(spec.numero, "")
+    elif spec.type_periode == TRIMESTRE:
+        context["quarter"] = spec.numero
+        context["quarter_label"] = dict(QUARTER_CHOICES).get(spec.numero, "")
+    return context
+
+
+def lignes_dashboard(annee, mois, centre_id=None):
+    """Cumuls du mois lus par le dashboard : (centre, livre, quantité, montant)."""
+    return (
+        CumulMensuel.objects.filter(annee=annee, mois=mois)
+        .du_centre(centre_id)
+        .values_list("centre__nom", "livre__nom", "quantite_vendue", "montant_ventes")
+    )
+
+
+def indicateurs_dashboard(annee, mois, centre_id=None):
+    """
+    KPI du dashboard pour un mois, en une requête sur les cumuls mensuels
+    (une ligne par centre / livre) ; les regroupements se font en mémoire.
+    """
+    lignes = lignes_dashboard(annee, mois, centre_id)
+
+    total_mois = 0
+    par_centre = {}
+    par_livre = {}
+    for centre_nom, livre_nom, quantite, montant in lignes:
+        total_mois += montant
+        par_centre[centre_nom] = par_centre.get(centre_nom, 0) + montant
+        livre = par_livre.setdefault(
+            livre_nom,
+            {"livre__nom": livre_nom, "quantite_vendue": 0, "montant_total": 0},
+        )
+        livre["quantite_vendue"] += quantite
+        livre["montant_total"] += montant
+
+    ventes_centres = sorted(
+        ({"centre__nom": nom, "total": total} for nom, total in par_centre.items()),
+        key=lambda v: (-v["total"], v["centre__nom"]),
+    )
+    ventes_livres = sorted(
+        par_livre.values(),
+        key=lambda v: (-v["quantite_vendue"], v["livre__nom"]),
+    )
+    return {
+        "total_mois": total_mois,
+        "meilleur_centre": ventes_centres[0] if ventes_centres else None,
+        "livre_top": ventes_livres[0] if ventes_livres else None,
+        "ventes_livres": ventes_livres,
+    }
+
+
+# pas de la série -> troncature de date_fin faite par la base
+TRONCATURES = {
+    SEMAINE: TruncWeek,
+    MOIS: TruncMonth,
+    TRIMESTRE: TruncQuarter,
+}
+
+CHAMPS_SERIE = ("quantite_vendue", "montant_ventes", "depenses")
+
+
+def serie_ventes(pas, date_debut, date_fin, centre_id=None, livre_id=None):
+    """
+    Ventes par semaine / mois / trimestre (de date_fin) entre deux dates,
+    en une requête groupée. Retourne [{"periode": date, champ: somme, ...}]
+    trié par période ; les périodes sans relevé sont absentes.
+    """
+    releves = ReleveCentreLivre.objects.filter(
+        date_fin__gte=date_debut,
+        date_fin__lte=date_fin,
+    ).du_centre(centre_id)
+    if livre_id:
+        releves = releves.filter(livre_id=livre_id)
+    return list(
+        releves.annotate(periode=TRONCATURES[pas]("date_fin"))
+        .values("periode")
+        .annotate(**{champ: Sum(champ) for champ in CHAMPS_SERIE})
+        .order_by("periode")
+    )
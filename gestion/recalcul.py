@@ -0,0 +1,103 @@
+# gestion/recalcul.py
+"""
+Recalcul en masse des champs dérivés des relevés (montant_ventes,
+quantite_reste, frais Mobile Money) après une correction de prix ou un
+changement de barème, sans passer par un save() par ligne.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import cache
+from .models import CumulMensuel, ReleveCentreLivre
+
+CHAMPS_DERIVES = (
+    "prix_unitaire",
+    "montant_ventes",
+    "quantite_reste",
+    "taux_frais_retrait",
+    "montant_frais_retrait",
+)
+
+TAILLE_LOT = 2000
+
+
+class ResultatRecalcul:
+    def __init__(self):
+        self.parcourus = 0
+        self.modifies = 0
+
+    def __str__(self):
+        return f"{self.parcourus} relevé(s) parcouru(s), {self.modifies} modifié(s)"
+
+
+def recalculer_releves(
+    releves,
+    taille_lot=TAILLE_LOT,
+    simulation=False,
+    reappliquer_bareme=False,
+    sur_ecart=None,
+):
+    """
+    Recalcule les relevés du queryset par lots de taille_lot (iterator +
+    bulk_update) : la mémoire ne dépend pas de la taille de la table.
+
+    simulation : rien n'est écrit, sur_ecart(releve, ecarts) est appelé pour
+      chaque relevé qui changerait ; ecarts = {champ: (ancien, nouveau)}.
+    reappliquer_bareme : un taux déjà enregistré est traité comme un taux
+      saisi à la main par save() ; avec cette option, les relevés avec un
+      opérateur repassent par le barème en vigueur (les taux saisis à la
+      main sont alors écrasés).
+    """
+    resultat = ResultatRecalcul()
+    touches = set()  # (centre_id, date_fin) des relevés modifiés
+
+    def traiter(lot):
+        anciens = [{champ: getattr(r, champ) for champ in CHAMPS_DERIVES} for r in lot]
+        if reappliquer_bareme:
+            for releve in lot:
+                if releve.operateur_mobile_money:
+                    releve.taux_frais_retrait = None
+        ReleveCentreLivre.calculer_montants_lot(lot)
+
+        modifies = []
+        for releve, ancien in zip(lot, anciens):
+            ecarts = {
+                champ: (ancien[champ], getattr(releve, champ))
+                for champ in CHAMPS_DERIVES
+                if ancien[champ] != getattr(releve, champ)
+            }
+            if ecarts:
+                modifies.append(releve)
+                touches.add((releve.centre_id, releve.date_fin))
+                if sur_ecart is not None:
+                    sur_ecart(releve, ecarts)
+
+        resultat.parcourus += len(lot)
+        resultat.modifies += len(modifies)
+        if modifies and not simulation:
+            # bulk_update ne renseigne pas les champs auto_now
+            maintenant = timezone.now()
+            for releve in modifies:
+                releve.modifie_le = maintenant
+            ReleveCentreLivre.objects.bulk_update(modifies, CHAMPS_DERIVES + ("modifie_le",))
+
+    flux = (
+        releves.select_related("livre")
+        .order_by("pk")
+        .iterator(chunk_size=taille_lot)
+    )
+    with transaction.atomic():
+        lot = []
+        for releve in flux:
+            lot.append(releve)
+            if len(lot) >= taille_lot:
+                traiter(lot)
+                lot = []
+        traiter(lot)
+
+        if touches and not simulation:
+            # bulk_update ne passe pas par save() : cumuls et cache à refaire
+            CumulMensuel.reconstruire({(d.year, d.month) for _, d in touches})
+            transaction.on_commit(lambda: cache.invalider_releves(touches))
+
+    return resultat
@@ -0,0 +1,44 @@
+# gestion/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import cache
+from .models import Centre, CumulMensuel, Livre, ReleveCentreLivre
+
+
+@receiver(post_delete, sender=ReleveCentreLivre)
+def retirer_releve_du_cumul(sender, instance, **kwargs):
+    # Envoyé aussi pour les suppressions en masse (admin) et en cascade,
+    # dans la même transaction que la suppression du relevé.
+    CumulMensuel.retirer(instance)
+
+
+@receiver(post_save, sender=ReleveCentreLivre)
+@receiver(post_delete, sender=ReleveCentreLivre)
+def invalider_cache_releve(sender, instance, **kwargs):
+    touches = {(instance.centre_id, instance.date_fin)}
+    ancien = getattr(instance, "_ancien_releve", None)
+    if ancien is not None:
+        touches.add((ancien.centre_id, ancien.date_fin))
+
+    # après commit : un lecteur concurrent ne doit pas remettre en cache
+    # des données d'avant la transaction
+    def invalider():
+        for centre_id, date_fin in touches:
+            cache.invalider_releve(centre_id, date_fin)
+
+    transaction.on_commit(invalider)
+
+
+@receiver(post_save, sender=Centre)
+@receiver(post_delete, sender=Centre)
+def invalider_cache_centre(sender, instance, **kwargs):
+    centre_id = instance.pk
+    transaction.on_commit(lambda: cache.invalider_centre(centre_id))
+
+
+@receiver(post_save, sender=Livre)
+@receiver(post_delete, sender=Livre)
+def invalider_cache_livres(sender, instance, **kwargs):
+    transaction.on_commit(cache.invalider_livres)
@@ -0,0 +1,64 @@
+# gestion/sqlite.py
+"""
+Profil de performances SQLite (réglage SQLITE_PERFORMANCES).
+
+Appliqué à chaque nouvelle connexion (signal connection_created) :
+- journal WAL : les lectures (rapports) ne bloquent plus derrière une
+  écriture (releve_create) et inversement ; un seul écrivain à la fois.
+- synchronous=NORMAL : sûr en WAL, un fsync par checkpoint au lieu d'un
+  par transaction (au pire les dernières transactions perdues sur coupure
+  de courant, jamais une base corrompue).
+- cache_size / mmap_size : pages gardées en mémoire par connexion, lecture
+  du fichier par projection mémoire.
+- busy_timeout : attendre le verrou au lieu d'échouer tout de suite avec
+  « database is locked ».
+
+Et en fin de requête (signal request_finished), au plus une fois par
+SQLITE_OPTIMIZE_INTERVALLE et par processus : PRAGMA optimize, qui relance
+ANALYZE sur les tables dont les statistiques du planificateur ont vieilli.
+
+Sans effet sur les autres bases (PostgreSQL en production).
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+_verrou = threading.Lock()
+_dernier_optimize = None
+
+
+def appliquer_pragmas(sender, connection, **kwargs):
+    """Récepteur de connection_created (branché par GestionConfig.ready)."""
+    if connection.vendor != "sqlite" or not settings.SQLITE_PERFORMANCES:
+        return
+    with connection.cursor() as curseur:
+        for nom, valeur in settings.SQLITE_PRAGMAS.items():
+            curseur.execute(f"PRAGMA {nom} = {valeur}")
+
+
+def _optimize_du():
+    """Vrai une fois par intervalle et par processus."""
+    global _dernier_optimize
+    maintenant = time.monotonic()
+    with _verrou:
+        if (
+            _dernier_optimize is not None
+            and maintenant - _dernier_optimize < settings.SQLITE_OPTIMIZE_INTERVALLE
+        ):
+            return False
+        _dernier_optimize = maintenant
+        return True
+
+
+def optimiser(sender, **kwargs):
+    """Récepteur de request_finished : PRAGMA optimize de temps en temps."""
+    if not settings.SQLITE_PERFORMANCES or not _optimize_du():
+        return
+    for connexion in connections.all(initialized_only=True):
+        # connexion déjà fermée (CONN_MAX_AGE atteint) : rien à rouvrir,
+        # optimize ne regarde que les tables lues par cette connexion
+        if connexion.vendor == "sqlite" and connexion.connection is not None:
+            with connexion.cursor() as curseur:
+                curseur.execute("PRAGMA optimize")
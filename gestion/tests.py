@@ -1,3 +1,657 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils.http import http_date
+
+from . import cache, exports, frais
+from .importation import ErreurImport, importer_releves
+from .models import Centre, CumulMensuel, Livre, ReleveCentreLivre
+from .pagination import ORDRE_RELEVES, apres_curseur, page_releves
+from .rapports import MOIS, ReportSpec
+
+# cache propre aux tests (pas le dossier de settings.py), rapports en cache
+CACHE_DE_TEST = {
+    "CACHES": {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    "RAPPORTS_CACHE_LOCAL": True,
+}
+
+
+def creer_releve(centre, livre, date_fin, recue=10, vendue=4, **champs):
+    """Relevé d'une semaine finissant à date_fin, enregistré par save()."""
+    return ReleveCentreLivre.objects.create(
+        centre=centre,
+        livre=livre,
+        date_debut=date_fin - timedelta(days=6),
+        date_fin=date_fin,
+        quantite_recue=recue,
+        quantite_vendue=vendue,
+        prix_unitaire=champs.pop("prix_unitaire", Decimal("1000")),
+        **champs,
+    )
+
+
+def _anciennes_regles(op, montant):
+    """
+    Règles d'avant le barème (ReleveCentreLivre._compute_mobile_money_fees
+    jusqu'au passage à gestion/frais.py), gardées comme référence.
+    """
+    montant = montant or Decimal("0")
+    if not op or montant <= 0:
+        return Decimal("0"), None
+    if op in ("ORANGE", "MOOV"):
+        taux = Decimal("1.00")
+        return (montant * taux / Decimal("100")).quantize(Decimal("0.01")), taux
+    if op == "WAVE":
+        return Decimal("0.00"), Decimal("0.00")
+    if op == "MTN":
+        if montant < Decimal("100000"):
+            return Decimal("0.00"), Decimal("0.00")
+        elif montant <= Decimal("500000"):
+            taux = Decimal("1.00")
+            return (montant * taux / Decimal("100")).quantize(Decimal("0.01")), taux
+        frais_fixes = Decimal("5000.00")
+        return frais_fixes, (frais_fixes * Decimal("100") / montant).quantize(Decimal("0.01"))
+    return Decimal("0"), None
+
+
+JOUR = date(2025, 3, 31)
+
+# montants autour des seuils MTN, petits et grands montants
+MONTANTS = [
+    Decimal(m)
+    for m in (
+        "0", "0.01", "1", "1500", "99999.99", "100000", "100000.01",
+        "250000", "499999.99", "500000", "500000.01", "500001", "1000000",
+        "12345678.90",
+    )
+]
+OPERATEURS = ["ORANGE", "MOOV", "WAVE", "MTN", "", None, "INCONNU"]
+
+
+class GrilleFraisTests(SimpleTestCase):
+    """Le barème doit donner exactement les résultats des anciennes règles."""
+
+    def setUp(self):
+        self.grille = frais.grille()
+
+    def assertIdentique(self, obtenu, attendu):
+        # même valeur ET même représentation Decimal (0.00 et non 0)
+        self.assertEqual(obtenu, attendu)
+        self.assertEqual([str(v) for v in obtenu], [str(v) for v in attendu])
+
+    def test_mtn_seuil_100000(self):
+        self.assertIdentique(
+            self.grille.calculer("MTN", Decimal("99999.99"), JOUR),
+            (Decimal("0.00"), Decimal("0.00")),
+        )
+        self.assertIdentique(
+            self.grille.calculer("MTN", Decimal("100000"), JOUR),
+            (Decimal("1000.00"), Decimal("1.00")),
+        )
+        self.assertIdentique(
+            self.grille.calculer("MTN", Decimal("100000.01"), JOUR),
+            (Decimal("1000.00"), Decimal("1.00")),
+        )
+
+    def test_mtn_seuil_500000(self):
+        self.assertIdentique(
+            self.grille.calculer("MTN", Decimal("500000"), JOUR),
+            (Decimal("5000.00"), Decimal("1.00")),
+        )
+        # au-delà : 5 000 fixes, taux effectif enregistré
+        self.assertIdentique(
+            self.grille.calculer("MTN", Decimal("500000.01"), JOUR),
+            (Decimal("5000.00"), Decimal("1.00")),
+        )
+        self.assertIdentique(
+            self.grille.calculer("MTN", Decimal("1000000"), JOUR),
+            (Decimal("5000.00"), Decimal("0.50")),
+        )
+
+    def test_wave_gratuit(self):
+        for montant in (Decimal("1"), Decimal("100000"), Decimal("750000")):
+            self.assertIdentique(
+                self.grille.calculer("WAVE", montant, JOUR),
+                (Decimal("0.00"), Decimal("0.00")),
+            )
+
+    def test_orange_moov_un_pour_cent(self):
+        for op in ("ORANGE", "MOOV"):
+            self.assertIdentique(
+                self.grille.calculer(op, Decimal("12345"), JOUR),
+                (Decimal("123.45"), Decimal("1.00")),
+            )
+            self.assertIdentique(
+                self.grille.calculer(op, Decimal("1000000"), JOUR),
+                (Decimal("10000.00"), Decimal("1.00")),
+            )
+
+    def test_sans_operateur_ou_montant_nul(self):
+        self.assertEqual(self.grille.calculer(None, Decimal("1000"), JOUR), (Decimal("0"), None))
+        self.assertEqual(self.grille.calculer("MTN", Decimal("0"), JOUR), (Decimal("0"), None))
+        self.assertEqual(self.grille.calculer("MTN", None, JOUR), (Decimal("0"), None))
+        self.assertEqual(self.grille.calculer("INCONNU", Decimal("1000"), JOUR), (Decimal("0"), None))
+
+    def test_identique_aux_anciennes_regles(self):
+        for op in OPERATEURS:
+            for montant in MONTANTS:
+                with self.subTest(op=op, montant=montant):
+                    self.assertIdentique(
+                        self.grille.calculer(op, montant, JOUR),
+                        _anciennes_regles(op, montant),
+                    )
+
+    def test_lot_identique_au_calcul_par_ligne(self):
+        jours = [date(2020, 1, 1), JOUR, None]
+        lignes = [(op, m, j) for op in OPERATEURS for m in MONTANTS for j in jours]
+        lot = self.grille.calculer_lot(lignes)
+        self.assertEqual(len(lot), len(lignes))
+        for (op, montant, jour), resultat in zip(lignes, lot):
+            with self.subTest(op=op, montant=montant, jour=jour):
+                self.assertIdentique(resultat, self.grille.calculer(op, montant, jour))
+
+
+class CalculerMontantsLotTests(SimpleTestCase):
+    def _releve(self, operateur, vendue, prix, taux=None):
+        return ReleveCentreLivre(
+            quantite_recue=vendue + 5,
+            quantite_vendue=vendue,
+            prix_unitaire=Decimal(prix),
+            operateur_mobile_money=operateur,
+            taux_frais_retrait=Decimal(taux) if taux is not None else None,
+            date_debut=date(2025, 3, 24),
+            date_fin=JOUR,
+        )
+
+    def test_taux_saisi_manuellement(self):
+        # le taux saisi est gardé tel quel, frais non arrondis (comme avant le
+        # calcul en lot) : c'est la base qui les ramène à 2 décimales
+        releve = self._releve("MTN", 3, "1500", taux="2.5")
+        ReleveCentreLivre.calculer_montants_lot([releve])
+        self.assertEqual(releve.montant_ventes, Decimal("4500"))
+        self.assertEqual(releve.taux_frais_retrait, Decimal("2.5"))
+        self.assertEqual(releve.montant_frais_retrait, Decimal("112.5"))
+
+        releve = self._releve("WAVE", 1, "0.50", taux="1")
+        ReleveCentreLivre.calculer_montants_lot([releve])
+        # cas d'égalité : 0.005 reste 0.005, pas d'arrondi au demi supérieur
+        self.assertEqual(str(releve.montant_frais_retrait), "0.005")
+
+    def test_lot_identique_ligne_a_ligne(self):
+        cas = [
+            ("MTN", 66, "1500", None),     # 99 000 : sous le seuil
+            ("MTN", 100, "1000", None),    # 100 000 pile
+            ("MTN", 500, "1000", None),    # 500 000 pile
+            ("MTN", 501, "1000", None),    # au-delà : fixe
+            ("WAVE", 200, "1500", None),
+            ("ORANGE", 7, "1750", None),
+            ("MOOV", 7, "1750", None),
+            ("ORANGE", 7, "1750", "3"),    # taux manuel
+            (None, 10, "1500", None),      # pas d'opérateur
+        ]
+        lot = [self._releve(*c) for c in cas]
+        ReleveCentreLivre.calculer_montants_lot(lot)
+        for c, releve_lot in zip(cas, lot):
+            releve = self._releve(*c)
+            releve.calculer_montants()
+            with self.subTest(cas=c):
+                self.assertEqual(releve_lot.montant_ventes, releve.montant_ventes)
+                self.assertEqual(releve_lot.montant_frais_retrait, releve.montant_frais_retrait)
+                self.assertEqual(releve_lot.taux_frais_retrait, releve.taux_frais_retrait)
+                # et les règles d'avant pour les frais automatiques
+                if c[3] is None and c[0]:
+                    attendu, taux = _anciennes_regles(c[0], releve.montant_ventes)
+                    self.assertEqual(releve_lot.montant_frais_retrait, attendu)
+                    self.assertEqual(releve_lot.taux_frais_retrait, taux)
+
+    def test_taux_manuel_comme_avant(self):
+        releve = self._releve("ORANGE", 3, "333.33", taux="1.5")
+        ReleveCentreLivre.calculer_montants_lot([releve])
+        # formule d'avant le calcul en lot, sans quantize
+        self.assertEqual(
+            str(releve.montant_frais_retrait),
+            str(Decimal("999.99") * Decimal("1.5") / Decimal("100")),
+        )
+
+
+@override_settings(**CACHE_DE_TEST)
+class PaginationReleveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        centres = list(Centre.objects.order_by("nom")[:3])
+        livres = list(Livre.objects.order_by("code"))
+        # beaucoup d'égalités : même date_fin pour tous les centres et livres,
+        # plusieurs relevés du même centre le même jour
+        for jour in (date(2025, 3, 2), date(2025, 3, 9), date(2025, 3, 16)):
+            for centre in centres:
+                for livre in livres:
+                    creer_releve(centre, livre, jour)
+
+    def _parcourir(self, qs, taille):
+        vus, curseur = [], None
+        while True:
+            releves, curseur = page_releves(qs, curseur, taille)
+            self.assertLessEqual(len(releves), taille)
+            vus.extend(r.pk for r in releves)
+            if curseur is None:
+                return vus
+
+    def test_toutes_les_pages_sans_trou_ni_doublon(self):
+        qs = ReleveCentreLivre.objects.select_related("centre")
+        attendu = list(qs.order_by(*ORDRE_RELEVES).values_list("pk", flat=True))
+        for taille in (1, 2, 3, 5, 7, len(attendu), len(attendu) + 1):
+            with self.subTest(taille=taille):
+                vus = self._parcourir(qs, taille)
+                self.assertEqual(len(vus), len(set(vus)))
+                self.assertEqual(vus, attendu)
+
+    def test_pages_d_un_centre(self):
+        centre = Centre.objects.order_by("nom").first()
+        qs = ReleveCentreLivre.objects.du_centre(centre.pk).select_related("centre")
+        attendu = list(qs.order_by(*ORDRE_RELEVES).values_list("pk", flat=True))
+        self.assertEqual(self._parcourir(qs, 4), attendu)
+
+    def test_page_profonde_bornee_par_date_fin(self):
+        # le prédicat du curseur garde une borne date_fin hors du OR
+        qs = ReleveCentreLivre.objects.select_related("centre")
+        _, curseur = page_releves(qs, None, 5)
+        sql = str(apres_curseur(qs.order_by(*ORDRE_RELEVES), curseur).query)
+        self.assertIn('"date_fin" <=', sql)
+
+
+class PurgeExportsTests(SimpleTestCase):
+    def setUp(self):
+        dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(dossier.cleanup)
+        self.dossier = Path(dossier.name)
+        reglages = override_settings(EXPORTS_CACHE_DIR=dossier.name, EXPORTS_PURGE_RENDUS=3)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        exports._rendus = 0
+
+    def _vieillir(self, chemin, secondes=7200):
+        t = time.time() - secondes
+        os.utime(chemin, (t, t))
+
+    def test_purge_anciens_fichiers_et_verrous_orphelins(self):
+        ancien = exports.obtenir("a" * 64, ".pdf", lambda f: f.write(b"a"))
+        recent = exports.obtenir("b" * 64, ".pdf", lambda f: f.write(b"b"))
+        self._vieillir(ancien)
+        self._vieillir(self.dossier / f"{'a' * 64}.pdf.verrou")
+        self.assertEqual(exports.purger_cache(3600), 1)
+        self.assertEqual(sorted(p.name for p in self.dossier.iterdir()), [
+            recent.name, f"{recent.name}.verrou",
+        ])
+
+    @unittest.skipIf(exports.fcntl is None, "pas de flock")
+    def test_verrou_tenu_garde(self):
+        verrou = self.dossier / "c.pdf.verrou"
+        with exports._verrou(verrou):
+            self.assertEqual(exports.purger_cache(0), 0)
+            self.assertTrue(verrou.exists())
+        exports.purger_cache(0)
+        self.assertFalse(verrou.exists())
+
+    def test_purge_tous_les_n_rendus(self):
+        with override_settings(EXPORTS_CACHE_CONSERVER_HEURES=0):
+            premier = exports.obtenir("1" * 64, ".xlsx", lambda f: f.write(b"1"))
+            exports.obtenir("2" * 64, ".xlsx", lambda f: f.write(b"2"))
+            # un fichier servi depuis le cache ne compte pas
+            exports.obtenir("1" * 64, ".xlsx", lambda f: f.write(b"1"))
+            self.assertTrue(premier.exists())
+            # 3e export à générer : purge (tout, à 0 h) avant son rendu
+            dernier = exports.obtenir("3" * 64, ".xlsx", lambda f: f.write(b"3"))
+        self.assertEqual(sorted(p.name for p in self.dossier.iterdir()), [
+            dernier.name, f"{dernier.name}.verrou",
+        ])
+
+
+@override_settings(**CACHE_DE_TEST)
+class PagesConditionnellesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_user(
+            "admin_test", role=get_user_model().ROLE_ADMIN
+        )
+        centre = Centre.objects.order_by("nom").first()
+        livres = Livre.objects.order_by("code")[:3]
+        cls.releves = [creer_releve(centre, livre, date(2025, 3, 16)) for livre in livres]
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_pas_de_last_modified(self):
+        demain = http_date(time.time() + 86400)
+        for url in ("/releves/", "/rapports/mois/?year=2025&month=3"):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn("ETag", response)
+                self.assertNotIn("Last-Modified", response)
+                # If-Modified-Since seul ne donne jamais de 304
+                self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=demain).status_code, 200)
+                self.assertEqual(
+                    self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304
+                )
+
+    def test_suppression_dans_le_rapport(self):
+        url = "/rapports/mois/?year=2025&month=3"
+        etag = self.client.get(url)["ETag"]
+        self.releves[0].delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    @mock.patch("gestion.views.RELEVES_PAR_PAGE", 2)
+    def test_fin_de_liste_change_l_etag(self):
+        response = self.client.get("/releves/")
+        self.assertIsNotNone(response.context["curseur_suivant"])
+        # la ligne supprimée n'est pas sur la page, mais le lien « suivant » disparaît
+        affiches = {r.pk for r in response.context["releves"]}
+        ReleveCentreLivre.objects.exclude(pk__in=affiches).delete()
+        response = self.client.get("/releves/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context["curseur_suivant"])
+
+
+class CumulsCoherentsMixin:
+    def _cumuls_attendus(self):
+        lignes = (
+            ReleveCentreLivre.objects.order_by()
+            .annotate(annee=ExtractYear("date_fin"), mois=ExtractMonth("date_fin"))
+            .values("centre_id", "livre_id", "annee", "mois")
+            .annotate(nb_releves=Count("id"), **{c: Sum(c) for c in CumulMensuel.CHAMPS})
+        )
+        return {
+            (ligne["centre_id"], ligne["livre_id"], ligne["annee"], ligne["mois"]): (
+                ligne["nb_releves"], *[ligne[c] for c in CumulMensuel.CHAMPS]
+            )
+            for ligne in lignes
+        }
+
+    def assertCumulsCoherents(self):
+        obtenu = {
+            (c.centre_id, c.livre_id, c.annee, c.mois): (
+                c.nb_releves, *[getattr(c, ch) for ch in CumulMensuel.CHAMPS]
+            )
+            for c in CumulMensuel.objects.all()
+        }
+        self.assertEqual(obtenu, self._cumuls_attendus())
+
+
+
+@override_settings(**CACHE_DE_TEST)
+class CumulMensuelTests(CumulsCoherentsMixin, TestCase):
+    """Après chaque opération, les cumuls = Sum direct sur les relevés."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.centres = list(Centre.objects.order_by("nom")[:2])
+        livres = list(Livre.objects.order_by("code")[:2])
+        for i, jour in enumerate((date(2025, 1, 12), date(2025, 1, 26), date(2025, 2, 9))):
+            for centre in cls.centres:
+                for livre in livres:
+                    creer_releve(
+                        centre, livre, jour,
+                        recue=20 + i, vendue=5 + i, depenses=Decimal("150"),
+                        operateur_mobile_money="ORANGE",
+                    )
+
+    def test_donnees_initiales(self):
+        self.assertCumulsCoherents()
+        self.assertEqual(CumulMensuel.objects.count(), 8)
+
+    def test_releve_deplace_vers_un_autre_mois(self):
+        releve = ReleveCentreLivre.objects.filter(date_fin=date(2025, 1, 26)).first()
+        releve.date_debut, releve.date_fin = date(2025, 3, 3), date(2025, 3, 9)
+        releve.quantite_vendue = 12
+        releve.save()
+        self.assertCumulsCoherents()
+        self.assertTrue(CumulMensuel.objects.filter(annee=2025, mois=3).exists())
+
+    def test_releve_deplace_vers_un_autre_centre(self):
+        releve = ReleveCentreLivre.objects.filter(
+            centre=self.centres[0], date_fin=date(2025, 2, 9)
+        ).first()
+        autre = Centre.objects.exclude(pk__in=[c.pk for c in self.centres]).first()
+        releve.centre = autre
+        releve.save()
+        self.assertCumulsCoherents()
+
+    def test_suppression_en_masse(self):
+        ReleveCentreLivre.objects.filter(date_fin__month=1, centre=self.centres[0]).delete()
+        self.assertCumulsCoherents()
+        # plus de relevé : plus de ligne de cumul
+        self.assertFalse(
+            CumulMensuel.objects.filter(centre=self.centres[0], mois=1).exists()
+        )
+
+    def test_suppression_en_cascade_d_un_centre(self):
+        self.centres[1].delete()
+        self.assertCumulsCoherents()
+        self.assertFalse(CumulMensuel.objects.filter(centre_id=self.centres[1].pk).exists())
+
+    def test_reconstruire(self):
+        # cumuls faussés par une mise à jour qui ne passe pas par save()
+        ReleveCentreLivre.objects.filter(date_fin__month=2).update(quantite_vendue=0)
+        CumulMensuel.objects.filter(mois=1).delete()
+        self.assertEqual(CumulMensuel.reconstruire([(2025, 1), (2025, 2)]), 8)
+        self.assertCumulsCoherents()
+        CumulMensuel.objects.update(quantite_recue=0)
+        CumulMensuel.reconstruire()
+        self.assertCumulsCoherents()
+
+
+def fichier_csv(lignes, entete="centre;livre;date_debut;date_fin;quantite_recue;quantite_vendue"):
+    texte = "\n".join([entete, *(";".join(map(str, ligne)) for ligne in lignes)])
+    return io.BytesIO(texte.encode("utf-8"))
+
+
+@override_settings(**CACHE_DE_TEST)
+class ImportReleveTests(CumulsCoherentsMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.centre = Centre.objects.order_by("nom").first()
+        cls.livres = list(Livre.objects.order_by("code")[:2])
+
+    def _lignes(self, vendue):
+        return [
+            (self.centre.nom, livre.code, debut, fin, 30, vendue + i)
+            for i, livre in enumerate(self.livres)
+            for debut, fin in (("2025-03-03", "2025-03-09"), ("10/03/2025", "16/03/2025"))
+        ]
+
+    def test_reimport_met_a_jour(self):
+        resultat = importer_releves(fichier_csv(self._lignes(5)), "releves.csv")
+        self.assertEqual((resultat.lignes_ecrites, resultat.erreurs), (4, []))
+        resultat = importer_releves(fichier_csv(self._lignes(12)), "releves.csv")
+        self.assertEqual((resultat.lignes_ecrites, resultat.erreurs), (4, []))
+
+        # une ligne par clé, avec les quantités du second fichier
+        self.assertEqual(ReleveCentreLivre.objects.count(), 4)
+        for releve in ReleveCentreLivre.objects.select_related("livre"):
+            vendue = 12 + self.livres.index(releve.livre)
+            self.assertEqual(releve.quantite_vendue, vendue)
+            self.assertEqual(releve.quantite_reste, 30 - vendue)
+            self.assertEqual(releve.montant_ventes, vendue * releve.livre.prix_unitaire_defaut)
+        self.assertCumulsCoherents()
+        cumul = CumulMensuel.objects.get(livre=self.livres[0], annee=2025, mois=3)
+        self.assertEqual((cumul.nb_releves, cumul.quantite_vendue), (2, 24))
+
+    def test_invalide_le_cache_au_commit(self):
+        mars = cache.periode_mois(2025, 3)
+        avril = cache.periode_mois(2025, 4)
+        perimetre = f"centre-{self.centre.pk}"
+        avant = {
+            (p, s): cache.cle_rapport("mois", p, s)
+            for p in (mars, avril) for s in ("admin", perimetre)
+        }
+        with self.captureOnCommitCallbacks(execute=True) as rappels:
+            importer_releves(fichier_csv(self._lignes(5)), "releves.csv")
+            # rien d'invalidé avant le commit
+            self.assertEqual(cache.cle_rapport("mois", mars, "admin"), avant[mars, "admin"])
+        self.assertEqual(len(rappels), 1)
+        for (p, s), cle in avant.items():
+            with self.subTest(periode=p, perimetre=s):
+                if p == mars:
+                    self.assertNotEqual(cache.cle_rapport("mois", p, s), cle)
+                else:
+                    self.assertEqual(cache.cle_rapport("mois", p, s), cle)
+
+    def test_fichiers_illisibles(self):
+        cas = [
+            (io.BytesIO(b"pas un classeur"), "releves.xlsx"),
+            # 0x81 : indéfini en utf-8 comme en cp1252
+            (io.BytesIO(fichier_csv([]).getvalue() + b"\n\x81\x8d\x90"), "releves.csv"),
+            (fichier_csv([], entete="centre;livre;date_debut"), "releves.csv"),
+            (io.BytesIO(b""), "releves.ods"),
+        ]
+        for fichier, nom in cas:
+            with self.subTest(nom=nom, debut=fichier.getvalue()[:20]):
+                with self.assertRaises(ErreurImport):
+                    importer_releves(fichier, nom)
+        self.assertFalse(ReleveCentreLivre.objects.exists())
+
+
+@override_settings(**CACHE_DE_TEST)
+class InvalidationCacheRapportsTests(TestCase):
+    """Une écriture change les jetons au commit : la lecture suivante recalcule."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.centre = Centre.objects.order_by("nom").first()
+        cls.livre = Livre.objects.order_by("code").first()
+        cls.mars = creer_releve(cls.centre, cls.livre, date(2025, 3, 16), vendue=4)
+        cls.avril = creer_releve(cls.centre, cls.livre, date(2025, 4, 13), vendue=6)
+
+    def setUp(self):
+        cache.cache.clear()
+        calculer = ReportSpec.calculer
+        patch = mock.patch.object(
+            ReportSpec, "calculer", autospec=True, side_effect=lambda spec: calculer(spec)
+        )
+        self.calculs = patch.start()
+        self.addCleanup(patch.stop)
+        self.specs = [ReportSpec(MOIS, 2025, 3), ReportSpec(MOIS, 2025, 3, self.centre.pk)]
+        for spec in self.specs:
+            spec.resoudre()
+        self.assertEqual(self.calculs.call_count, 2)
+
+    def _relire(self):
+        """Relit les rapports de mars ; retourne le nombre de recalculs."""
+        avant = self.calculs.call_count
+        resultats = [spec.resoudre() for spec in self.specs]
+        self.resultat = resultats[0]
+        return self.calculs.call_count - avant
+
+    def test_relecture_depuis_le_cache(self):
+        self.assertEqual(self._relire(), 0)
+
+    def test_releve_modifie(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mars.quantite_vendue = 9
+            self.mars.save()
+            # pas encore commité : le cache sert toujours l'ancienne valeur
+            self.assertEqual(self._relire(), 0)
+        self.assertEqual(self._relire(), 2)
+        self.assertEqual(self.resultat.totaux(self.livre)["q_vendue"], 9)
+
+    def test_releve_d_un_autre_mois(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.avril.quantite_vendue = 2
+            self.avril.save()
+        self.assertEqual(self._relire(), 0)
+
+    def test_releve_deplace_dans_le_mois(self):
+        # l'ancienne période (avril) et la nouvelle (mars) sont invalidées
+        with self.captureOnCommitCallbacks(execute=True):
+            self.avril.date_debut, self.avril.date_fin = date(2025, 3, 24), date(2025, 3, 30)
+            self.avril.save()
+        self.assertEqual(self._relire(), 2)
+        self.assertEqual(self.resultat.totaux(self.livre)["q_vendue"], 10)
+
+    def test_releve_supprime(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mars.delete()
+        self.assertEqual(self._relire(), 2)
+        self.assertEqual(self.resultat.totaux(self.livre)["q_vendue"], 0)
+
+    def test_centre_modifie(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.centre.nom = "Centre renommé"
+            self.centre.save()
+        self.assertEqual(self._relire(), 2)
+        noms = {row["centre"].pk: row["centre"].nom for row in self.resultat.rows}
+        self.assertEqual(noms[self.centre.pk], "Centre renommé")
+
+    def test_autre_centre_modifie(self):
+        autre = Centre.objects.exclude(pk=self.centre.pk).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            autre.save()
+        # le rapport admin couvre tous les centres, pas celui du premier centre
+        self.assertEqual(self._relire(), 1)
+
+    def test_livre_modifie(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.livre.nom = "Livre renommé"
+            self.livre.save()
+        self.assertEqual(self._relire(), 2)
+        noms = {livre.pk: livre.nom for livre in self.resultat.livres}
+        self.assertEqual(noms[self.livre.pk], "Livre renommé")
+
+
+@override_settings(**CACHE_DE_TEST)
+class ResultatPerimeAccepteTests(SimpleTestCase):
+    cle = "rapports:kpi:global:admin"
+
+    def setUp(self):
+        cache.cache.clear()
+        self.calculs = 0
+
+    def _calcul(self):
+        self.calculs += 1
+        # le verrou est tenu pendant le calcul, à froid comme à chaud
+        self.assertIsNotNone(cache.cache.get(self.cle + ":verrou"))
+        return self.calculs
+
+    def _lire(self, duree_fraiche=60):
+        return cache.resultat_perime_accepte("kpi", "global", "admin", self._calcul, duree_fraiche)
+
+    def test_calcul_a_froid_puis_valeur_fraiche(self):
+        self.assertEqual(self._lire(), 1)
+        self.assertEqual(self._lire(), 1)
+        self.assertIsNone(cache.cache.get(self.cle + ":verrou"))
+
+    def test_perime_servi_pendant_un_recalcul(self):
+        self._lire(duree_fraiche=0)
+        cache.cache.add(self.cle + ":verrou", 1)
+        self.assertEqual(self._lire(), 1)
+        self.assertEqual(self.calculs, 1)
+
+    def test_a_froid_attend_le_calcul_en_cours(self):
+        cache.cache.add(self.cle + ":verrou", 1)
+        # l'autre requête finit son calcul pendant qu'on attend
+        autre = threading.Timer(0.1, cache.cache.set, (self.cle, ("v", 0, "calculé ailleurs")))
+        autre.start()
+        self.addCleanup(autre.cancel)
+        self.assertEqual(self._lire(), "calculé ailleurs")
+        self.assertEqual(self.calculs, 0)
+
+    @mock.patch.object(cache, "DUREE_ATTENTE", 0.2)
+    def test_a_froid_calcul_si_l_attente_depasse(self):
+        cache.cache.add(self.cle + ":verrou", "autre")
+        calcul = mock.Mock(return_value="calculé ici")
+        self.assertEqual(
+            cache.resultat_perime_accepte("kpi", "global", "admin", calcul, 60), "calculé ici"
+        )
+        # le verrou de l'autre requête n'est pas supprimé
+        self.assertEqual(cache.cache.get(self.cle + ":verrou"), "autre")
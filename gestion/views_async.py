@@ -0,0 +1,112 @@
+# gestion/views_async.py
+"""
+Versions async des pages de rapport et du dashboard, utilisées quand
+l'application est servie en ASGI (gestion_livre/asgi.py, réglage VUES_ASYNC).
+
+Mêmes URL, mêmes gabarits et mêmes ETag que gestion/views.py ; les
+requêtes indépendantes d'une page partent en parallèle (gestion/asynchrone.py)
+et le worker reste libre pour les autres requêtes pendant l'attente.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response
+
+from . import cache
+from .asynchrone import en_thread
+from .rapports import (
+    ANNEE,
+    GLOBAL,
+    MOIS,
+    MONTH_CHOICES,
+    QUARTER_CHOICES,
+    SEMAINE,
+    TRIMESTRE,
+    ReportSpec,
+    contexte_rapport,
+)
+from .views import _contexte_dashboard, _etag_page, _validateurs, _year_choices
+
+
+async def _charger_utilisateur(request):
+    # chargé une fois ici : centre_perimetre() et les gabarits relisent
+    # ensuite request.user sans requête depuis la boucle async
+    request.user = await request.auser()
+
+
+async def _page_rapport(request, type_periode, gabarit, **extra):
+    """Comme views._page_rapport : filigrane et jetons du cache lus en même temps."""
+    await _charger_utilisateur(request)
+    spec = ReportSpec.depuis_requete(request, type_periode)
+    (dernier, nombre), cle = await asyncio.gather(
+        en_thread(spec.filigrane),
+        sync_to_async(cache.cle_rapport)("page", spec.periode, spec.perimetre),
+    )
+    etag = _etag_page(request, cle, dernier, nombre)
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        context = contexte_rapport(spec, await spec.aresoudre())
+        context.update(extra)
+        # le gabarit peut encore toucher la base (messages en session…)
+        response = await sync_to_async(render)(request, gabarit, context)
+    _validateurs(response, etag)
+    return response
+
+
+@login_required
+async def rapport_hebdomadaire(request):
+    return await _page_rapport(
+        request,
+        SEMAINE,
+        "gestion/rapport_hebdomadaire.html",
+        year_choices=_year_choices(),
+        week_choices=[(i, f"Semaine {i}") for i in range(1, 54)],
+    )
+
+
+@login_required
+async def rapport_mensuel(request):
+    return await _page_rapport(
+        request,
+        MOIS,
+        "gestion/rapport_mensuel.html",
+        year_choices=_year_choices(),
+        month_choices=MONTH_CHOICES,
+    )
+
+
+@login_required
+async def rapport_trimestriel(request):
+    return await _page_rapport(
+        request,
+        TRIMESTRE,
+        "gestion/rapport_trimestriel.html",
+        year_choices=_year_choices(),
+        quarter_choices=QUARTER_CHOICES,
+    )
+
+
+@login_required
+async def rapport_annuel(request):
+    return await _page_rapport(
+        request,
+        ANNEE,
+        "gestion/rapport_annuel.html",
+        year_choices=_year_choices(),
+    )
+
+
+@login_required
+async def rapport_global(request):
+    return await _page_rapport(request, GLOBAL, "gestion/rapport_global.html")
+
+
+@login_required
+async def dashboard(request):
+    await _charger_utilisateur(request)
+    # une seule requête groupée pour les KPI (voir indicateurs_dashboard)
+    context = await en_thread(lambda: _contexte_dashboard(request.user))
+    return await sync_to_async(render)(request, "gestion/dashboard.html", context)
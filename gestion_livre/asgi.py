@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gestion_livre.settings')
+# rapports et dashboard servis par les vues async (voir gestion/views_async.py)
+os.environ.setdefault('VUES_ASYNC', 'True')
 
 application = get_asgi_application()
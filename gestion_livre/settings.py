@@ -47,6 +47,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # en premier : mesure toute la requête (voir gestion/middleware.py)
+    'gestion.middleware.ServerTimingMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -61,7 +63,8 @@ ROOT_URLCONF = 'gestion_livre.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates dont le temps de rendu est mesuré (Server-Timing)
+        'BACKEND': 'gestion.instrumentation.DjangoTemplatesMesures',
         "DIRS": [BASE_DIR / "templates"],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -79,6 +82,12 @@ STATICFILES_DIRS = [BASE_DIR / "static"]
 STATIC_ROOT = BASE_DIR / "staticfiles"
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 AUTH_USER_MODEL = "accounts.User"
+AUTHENTICATION_BACKENDS = [
+    # request.user chargé avec son centre (voir accounts/backends.py)
+    "accounts.backends.ModelBackendAvecCentre",
+    # sessions ouvertes avant ce backend : elles en gardent le chemin
+    "django.contrib.auth.backends.ModelBackend",
+]
 CSRF_TRUSTED_ORIGINS = os.environ.get(
     "DJANGO_CSRF_TRUSTED_ORIGINS",
     ""
@@ -107,6 +116,28 @@ DATABASES = {
     )
 }
 
+# Profil SQLite pour les petits déploiements sur db.sqlite3 (voir
+# gestion/sqlite.py) : pragmas posés à chaque connexion, PRAGMA optimize
+# périodique. Sans effet sur PostgreSQL. Mesure : manage.py benchmark_sqlite.
+SQLITE_PERFORMANCES = os.environ.get("SQLITE_PERFORMANCES", "False") == "True"
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    # négatif = en Kio : ~20 Mo de cache de pages par connexion
+    "cache_size": -20000,
+    "mmap_size": 128 * 1024 * 1024,
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+    # borne le travail d'ANALYZE lancé par PRAGMA optimize
+    "analysis_limit": 1000,
+}
+SQLITE_OPTIMIZE_INTERVALLE = 3600  # secondes, par processus
+
+if SQLITE_PERFORMANCES and DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3":
+    # BEGIN IMMEDIATE : une transaction d'écriture prend le verrou dès le
+    # début et attend busy_timeout s'il est pris, au lieu d'échouer en plein
+    # milieu (« database is locked ») quand elle passe de lecture à écriture
+    DATABASES["default"].setdefault("OPTIONS", {})["transaction_mode"] = "IMMEDIATE"
+
 
 
 # Password validation
@@ -141,3 +172,78 @@ AUTH_PASSWORD_VALIDATORS = [
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Cache partagé par tous les workers gunicorn d'une machine, sans service
+# externe : un fichier par entrée sous DJANGO_CACHE_DIR. Les jetons de version
+# des rapports (gestion/cache.py) y sont donc vus par tous les processus.
+# Un dossier vidé ou une entrée évincée ne coûte qu'un recalcul.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get("DJANGO_CACHE_DIR", str(BASE_DIR / "cache_django")),
+        "OPTIONS": {
+            # sessions + jetons + rapports : 300 (défaut) évincerait trop tôt
+            "MAX_ENTRIES": int(os.environ.get("DJANGO_CACHE_MAX_ENTRIES", 5000)),
+        },
+    },
+}
+
+# Sessions lues dans le cache, écrites en base et dans le cache : plus de
+# SELECT sur django_session à chaque requête authentifiée, et une session
+# évincée du cache est relue en base (pas de déconnexion).
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+
+# Durée de vie (secondes) des rapports en cache. Les écritures invalident
+# déjà les périodes touchées (jetons vus par tous les workers) ; ce délai
+# borne surtout la place prise par les entrées devenues orphelines.
+RAPPORTS_CACHE_TIMEOUT = int(os.environ.get("RAPPORTS_CACHE_TIMEOUT", 300))
+
+# Avec un cache propre à chaque processus (LocMemCache), les rapports ne
+# sont pas mis en cache (voir gestion/cache.cache_actif) ; "True" les y met
+# quand même, pour un seul processus (runserver).
+RAPPORTS_CACHE_LOCAL = os.environ.get("RAPPORTS_CACHE_LOCAL", "False") == "True"
+
+# KPI du dashboard : frais pendant ce délai (secondes), puis servis périmés
+# le temps qu'une seule requête les recalcule (gestion/cache.py).
+DASHBOARD_CACHE_TIMEOUT = int(os.environ.get("DASHBOARD_CACHE_TIMEOUT", 60))
+
+
+# Exports PDF : par défaut rendus dans la requête. Avec "True", ils sont mis
+# en file (TacheExportPdf) et rendus par la commande traiter_exports_pdf, qui
+# doit alors tourner en continu et voir la même base que le site : base
+# partagée (PostgreSQL) si elle tourne dans un service à part. Sans ce
+# worker, les demandes resteraient « En attente ».
+EXPORTS_PDF_EN_ARRIERE_PLAN = os.environ.get("EXPORTS_PDF_EN_ARRIERE_PLAN", "False") == "True"
+
+# Vues async pour les rapports et le dashboard (gestion/views_async.py).
+# Activé par gestion_livre/asgi.py : en WSGI, les vues synchrones restent.
+VUES_ASYNC = os.environ.get("VUES_ASYNC", "False") == "True"
+
+# Fichiers Excel / PDF déjà générés, rangés sous l'empreinte de leur contenu
+# (gestion/exports.py). Chaque processus peut avoir son propre dossier : un
+# fichier absent est simplement regénéré. Les fichiers non servis depuis
+# EXPORTS_CACHE_CONSERVER_HEURES sont purgés toutes les
+# EXPORTS_PURGE_RENDUS exports à générer dans un processus (0 : jamais, la
+# commande purger_exports reste, en cron par exemple) et par traiter_exports_pdf.
+EXPORTS_CACHE_DIR = os.environ.get("EXPORTS_CACHE_DIR", str(BASE_DIR / "cache_exports"))
+EXPORTS_CACHE_CONSERVER_HEURES = int(os.environ.get("EXPORTS_CACHE_CONSERVER_HEURES", 24))
+EXPORTS_PURGE_RENDUS = int(os.environ.get("EXPORTS_PURGE_RENDUS", 50))
+
+
+# Une ligne par requête sur le logger « gestion.perf » (URL, statut, SQL,
+# rendu, exports) ; PERF_LOG_LEVEL=WARNING pour les couper.
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "gestion.perf": {
+            "handlers": ["console"],
+            "level": os.environ.get("PERF_LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
+    },
+}
@@ -1,4 +1,5 @@
 # gestion_livre/urls.py
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 from django.contrib.auth import views as auth_views
@@ -16,10 +17,14 @@ from gestion.views import (
     export_rapport_mensuel_excel,
     export_rapport_trimestriel_excel,
     export_rapport_annuel_excel,
+    export_rapport_annuel_detaille_excel,
     export_rapport_global_excel,
     export_rapport_mensuel_pdf,
     export_rapport_trimestriel_pdf,
     export_rapport_annuel_pdf,
+    export_pdf_tache,
+    export_pdf_telecharger,
+    api_ventes,
     livre_list,
     livre_create,
     livre_update,
@@ -30,6 +35,17 @@ from gestion.views import (
     centre_delete,
 )
 
+# Servi en ASGI : rapports et dashboard en versions async (mêmes URL)
+if settings.VUES_ASYNC:
+    from gestion.views_async import (  # noqa: F811
+        dashboard,
+        rapport_hebdomadaire,
+        rapport_trimestriel,
+        rapport_mensuel,
+        rapport_annuel,
+        rapport_global,
+    )
+
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -90,12 +106,28 @@ urlpatterns = [
         export_rapport_annuel_excel,
         name="export_rapport_annuel_excel",
     ),
+    path(
+        "rapports/annee/export-excel-detaille/",
+        export_rapport_annuel_detaille_excel,
+        name="export_rapport_annuel_detaille_excel",
+    ),
     path(
         "rapports/annee/export-pdf/",
         export_rapport_annuel_pdf,
         name="export_rapport_annuel_pdf",
     ),
 
+    # Exports PDF générés en arrière-plan
+    path("exports/pdf/<int:pk>/", export_pdf_tache, name="export_pdf_tache"),
+    path(
+        "exports/pdf/<int:pk>/telecharger/",
+        export_pdf_telecharger,
+        name="export_pdf_telecharger",
+    ),
+
+    # API JSON (graphiques)
+    path("api/ventes/", api_ventes, name="api_ventes"),
+
     # Livres (CRUD admin)
     path("livres/", livre_list, name="livre_list"),
     path("livres/nouveau/", livre_create, name="livre_create"),
@@ -0,0 +1,126 @@
+# gunicorn.conf.py
+"""
+Configuration gunicorn de production (chargée par « gunicorn -c gunicorn.conf.py »).
+
+- preload_app : l'application est importée une fois dans le maître, puis les
+  workers sont forkés (mémoire partagée en copy-on-write, démarrage plus court).
+  Possible parce que rien ne touche la base à l'import (voir accounts/apps.py).
+- workers gthread : plusieurs threads par worker, un export lent n'occupe
+  qu'un thread au lieu de bloquer tout le worker.
+- nombre de workers d'après les CPU et la mémoire du conteneur (cgroup).
+- max_requests : chaque worker est recyclé après un certain nombre de
+  requêtes (fuites mémoire, fragmentation après de gros exports).
+
+Tout se règle aussi par variables d'environnement (GUNICORN_*) ;
+GUNICORN_ASGI=True sert l'application ASGI avec des workers uvicorn.
+"""
+import os
+import resource
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+wsgi_app = "gestion_livre.wsgi:application"
+
+preload_app = os.environ.get("GUNICORN_PRELOAD", "True") == "True"
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# GUNICORN_ASGI=True : application ASGI (vues async des rapports, voir
+# gestion_livre/asgi.py) servie par des workers uvicorn
+if os.environ.get("GUNICORN_ASGI", "False") == "True":
+    wsgi_app = "gestion_livre.asgi:application"
+    worker_class = "uvicorn_worker.UvicornWorker"
+
+# mémoire comptée par worker (Mo) : ~50 Mo au repos, ~110 Mo après un export PDF
+MEMOIRE_PAR_WORKER_MO = int(os.environ.get("GUNICORN_MEMOIRE_WORKER_MO", 128))
+
+
+def _memoire_disponible_mo():
+    """Limite mémoire du conteneur (cgroup v2 puis v1), sinon mémoire de la machine."""
+    if os.environ.get("GUNICORN_MEMOIRE_MO"):
+        return int(os.environ["GUNICORN_MEMOIRE_MO"])
+    for chemin in (
+        "/sys/fs/cgroup/memory.max",
+        "/sys/fs/cgroup/memory/memory.limit_in_bytes",
+    ):
+        try:
+            with open(chemin) as f:
+                valeur = f.read().strip()
+        except OSError:
+            continue
+        # « max » ou valeur énorme (pas de limite en v1) : on passe à la suite
+        if valeur.isdigit() and int(valeur) < 1 << 50:
+            return int(valeur) // (1024 * 1024)
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+    except (ValueError, OSError):
+        return 512
+
+
+def _cpu_disponibles():
+    """CPU du quota cgroup (conteneur) s'il y en a un, sinon ceux de la machine."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, periode = f.read().split()
+        if quota != "max":
+            return max(1, -(-int(quota) // int(periode)))
+    except (OSError, ValueError):
+        pass
+    return os.cpu_count() or 1
+
+
+def _nombre_workers():
+    if os.environ.get("GUNICORN_WORKERS"):
+        return int(os.environ["GUNICORN_WORKERS"])
+    par_cpu = 2 * _cpu_disponibles() + 1
+    # le maître garde environ la place d'un worker
+    par_memoire = _memoire_disponible_mo() // MEMOIRE_PAR_WORKER_MO - 1
+    return max(1, min(par_cpu, par_memoire))
+
+
+workers = _nombre_workers()
+
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+# un PDF rendu dans la requête (EXPORTS_PDF_EN_ARRIERE_PLAN=False) peut être long
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+graceful_timeout = 30
+keepalive = 5
+
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOG_LEVEL", "info")
+
+
+def _rss_mo():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+
+
+# --- cycle de vie des workers, dans le log d'erreurs gunicorn ---
+
+def when_ready(server):
+    server.log.info(
+        "Prêt : %s worker(s) %s (%s thread(s) en gthread), preload=%s, max_requests=%s (+%s)",
+        workers, worker_class, threads, preload_app, max_requests, max_requests_jitter,
+    )
+
+
+def post_fork(server, worker):
+    # avec preload_app, une connexion ouverte par le maître serait partagée
+    # entre workers : chacun repart sans connexion
+    from django.db import connections
+
+    connections.close_all()
+    server.log.info("Worker %s démarré", worker.pid)
+
+
+def worker_exit(server, worker):
+    server.log.info(
+        "Worker %s arrêté après %s requête(s), RSS max %s Mo",
+        worker.pid, worker.nr, _rss_mo(),
+    )
+
+
+def worker_abort(worker):
+    worker.log.warning(
+        "Worker %s interrompu (timeout de %s s dépassé)", worker.pid, timeout
+    )